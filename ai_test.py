@@ -1,17 +1,14 @@
-import os
-from openai import OpenAI
+from llm_gateway import chat
 
-# Initialize client using the environment variable
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-
-# Send a simple test prompt to GPT
-response = client.chat.completions.create(
-    model="gpt-3.5-turbo",
-    messages=[
+# Send a simple test prompt to GPT through the shared gateway (uses OPENAI_API_KEY)
+answer = chat(
+    [
         {"role": "system", "content": "You are a helpful AI assistant."},
         {"role": "user", "content": "Explain AI in one simple sentence."}
-    ]
+    ],
+    model="gpt-3.5-turbo",
+    backend="openai",
 )
 
 # Print the model's reply
-print("🤖 GPT says:", response.choices[0].message.content)
+print("🤖 GPT says:", answer)
@@ -0,0 +1,267 @@
+import os
+import json
+import time
+import argparse
+import numpy as np
+from retrieval import DocIndex, Passage, normalize, search_vectors, top_k_indices
+
+# --------------------------
+# 1. Settings
+# --------------------------
+# ANN_INDEX=ivf (NumPy, no extra deps) or hnsw (needs hnswlib). Below
+# ANN_MIN_PASSAGES exact search is both faster and exact, so it is kept.
+# Both are built from in-memory float32 vectors (EMBED_STORE_DTYPE=float32).
+ANN_INDEX = os.getenv("ANN_INDEX", "none")
+ANN_KINDS = ("ivf", "hnsw")
+ANN_MIN_PASSAGES = int(os.getenv("ANN_MIN_PASSAGES", "20000"))
+# IVF: more probed lists = higher recall, slower queries
+ANN_N_PROBE = int(os.getenv("ANN_N_PROBE", "16"))
+ANN_TRAIN_SAMPLE = 50000
+ANN_TRAIN_ITERATIONS = 10
+# HNSW: higher ef = higher recall, slower queries
+ANN_EF = int(os.getenv("ANN_EF", "64"))
+HNSW_M = 16
+HNSW_EF_CONSTRUCTION = 200
+ASSIGN_CHUNK = 8192
+
+# --------------------------
+# 2. Shared helpers
+# --------------------------
+def nearest_centroid(vectors, centroids):
+    out = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK):
+        out[start:start + ASSIGN_CHUNK] = np.argmax(vectors[start:start + ASSIGN_CHUNK] @ centroids.T, axis=1)
+    return out
+
+# Spherical k-means on a sample; empty lists are re-seeded from random vectors
+def train_centroids(vectors, n_lists, iterations=ANN_TRAIN_ITERATIONS, seed=0):
+    rng = np.random.default_rng(seed)
+    if len(vectors) > ANN_TRAIN_SAMPLE:
+        vectors = vectors[np.sort(rng.choice(len(vectors), ANN_TRAIN_SAMPLE, replace=False))]
+    centroids = np.array(vectors[rng.choice(len(vectors), n_lists, replace=False)], dtype=np.float32)
+    for _ in range(iterations):
+        assign = nearest_centroid(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, vectors)
+        empty = np.bincount(assign, minlength=n_lists) == 0
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = normalize(sums)
+    return centroids
+
+def save_passages(path, passages):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([list(p) for p in passages], f)
+
+def load_passages(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [Passage(*p) for p in json.load(f)]
+
+# --------------------------
+# 3. IVF (inverted file) index
+# --------------------------
+# Vectors are bucketed by their nearest k-means centroid; a query scores only
+# the rows in its n_probe closest buckets. At build time passages are reordered
+# bucket by bucket, so each bucket is one contiguous slice of the matrix and is
+# scored without a gather copy. Inserted rows are appended to the end and
+# tracked per bucket until the next build. The float32 matrix stays complete,
+# so HybridRetriever's candidate re-scoring keeps working.
+class IVFIndex(DocIndex):
+    def __init__(self, passages, matrix, centroids, bounds, n_probe=ANN_N_PROBE, extra=None):
+        self.buffer = np.ascontiguousarray(matrix, dtype=np.float32)
+        super().__init__(list(passages), self.buffer[:len(passages)])
+        self.centroids = centroids
+        self.bounds = bounds
+        self.extra = extra or {}
+        self.n_probe = n_probe
+
+    @classmethod
+    def build(cls, index, n_lists=None, n_probe=ANN_N_PROBE, seed=0):
+        matrix = np.asarray(index.matrix, dtype=np.float32)
+        n_lists = n_lists or max(1, min(65536, int(np.sqrt(len(matrix)))))
+        centroids = train_centroids(matrix, min(n_lists, len(matrix)), seed=seed)
+        assign = nearest_centroid(matrix, centroids)
+        order = np.argsort(assign, kind="stable")
+        bounds = np.searchsorted(assign[order], np.arange(len(centroids) + 1))
+        passages = [index.passages[i] for i in order]
+        return cls(passages, matrix[order], centroids, bounds, n_probe)
+
+    def search(self, queries, top_k):
+        probe = min(self.n_probe, len(self.centroids))
+        results = []
+        for query, centroid_scores in zip(queries, queries @ self.centroids.T):
+            rows, scores = [], []
+            for c in np.argpartition(-centroid_scores, probe - 1)[:probe]:
+                start, end = self.bounds[c], self.bounds[c + 1]
+                rows.append(np.arange(start, end))
+                scores.append(self.matrix[start:end] @ query)
+                if c in self.extra:
+                    rows.append(self.extra[c])
+                    scores.append(self.matrix[self.extra[c]] @ query)
+            rows, scores = np.concatenate(rows), np.concatenate(scores)
+            results.append([(int(rows[i]), float(scores[i])) for i in top_k_indices(scores, top_k)])
+        return results
+
+    # Incremental insert: new rows go to their nearest existing bucket.
+    # Rebuild once inserts make up a large share of the index.
+    def add(self, passages, vectors):
+        vectors = normalize(np.atleast_2d(vectors))
+        start, end = len(self.passages), len(self.passages) + len(vectors)
+        if end > len(self.buffer):
+            grown = np.empty((max(end, 2 * len(self.buffer)), self.buffer.shape[1]), dtype=np.float32)
+            grown[:start] = self.buffer[:start]
+            self.buffer = grown
+        self.buffer[start:end] = vectors
+        assign = nearest_centroid(vectors, self.centroids)
+        for c in np.unique(assign):
+            added = start + np.flatnonzero(assign == c)
+            self.extra[int(c)] = np.concatenate([self.extra[int(c)], added]) if int(c) in self.extra else added
+        self.passages = self.passages + list(passages)
+        self.matrix = self.buffer[:end]
+
+    def save(self, path):
+        extra = {str(c): rows.tolist() for c, rows in self.extra.items()}
+        np.savez(f"{path}.npz", matrix=self.matrix, centroids=self.centroids, bounds=self.bounds)
+        save_passages(f"{path}.passages.json", self.passages)
+        with open(f"{path}.json", "w", encoding="utf-8") as f:
+            json.dump({"kind": "ivf", "n_probe": self.n_probe, "extra": extra}, f)
+
+    @classmethod
+    def load(cls, path, n_probe=None):
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        data = np.load(f"{path}.npz")
+        extra = {int(c): np.array(rows, dtype=np.int64) for c, rows in manifest["extra"].items()}
+        return cls(load_passages(f"{path}.passages.json"), data["matrix"], data["centroids"], data["bounds"],
+                   n_probe or manifest["n_probe"], extra)
+
+# --------------------------
+# 4. HNSW index (optional hnswlib)
+# --------------------------
+class HNSWIndex(DocIndex):
+    def __init__(self, passages, matrix, graph, ef=ANN_EF):
+        super().__init__(list(passages), np.ascontiguousarray(matrix, dtype=np.float32))
+        self.graph = graph
+        self.ef = ef
+        graph.set_ef(ef)
+
+    @staticmethod
+    def new_graph(dim, capacity):
+        import hnswlib
+        graph = hnswlib.Index(space="ip", dim=dim)
+        graph.init_index(max_elements=max(1, capacity), ef_construction=HNSW_EF_CONSTRUCTION, M=HNSW_M)
+        return graph
+
+    @classmethod
+    def build(cls, index, ef=ANN_EF):
+        matrix = np.asarray(index.matrix, dtype=np.float32)
+        graph = cls.new_graph(matrix.shape[1], len(matrix))
+        graph.add_items(matrix, np.arange(len(matrix)))
+        return cls(index.passages, matrix, graph, ef)
+
+    def search(self, queries, top_k):
+        k = min(top_k, len(self.passages))
+        if k == 0:
+            return [[] for _ in queries]
+        self.graph.set_ef(max(self.ef, k))
+        labels, distances = self.graph.knn_query(queries, k=k)
+        # hnswlib's "ip" distance is 1 - dot product
+        return [[(int(r), float(1.0 - d)) for r, d in zip(row_labels, row_dists)]
+                for row_labels, row_dists in zip(labels, distances)]
+
+    def add(self, passages, vectors):
+        vectors = normalize(np.atleast_2d(vectors))
+        start = len(self.passages)
+        if start + len(vectors) > self.graph.get_max_elements():
+            self.graph.resize_index(max(start + len(vectors), 2 * self.graph.get_max_elements()))
+        self.graph.add_items(vectors, np.arange(start, start + len(vectors)))
+        self.passages = self.passages + list(passages)
+        self.matrix = np.vstack([self.matrix, vectors])
+
+    def save(self, path):
+        self.graph.save_index(f"{path}.hnsw")
+        np.save(f"{path}.npy", self.matrix)
+        save_passages(f"{path}.passages.json", self.passages)
+        with open(f"{path}.json", "w", encoding="utf-8") as f:
+            json.dump({"kind": "hnsw", "ef": self.ef}, f)
+
+    @classmethod
+    def load(cls, path, ef=None):
+        with open(f"{path}.json", "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        import hnswlib
+        matrix = np.load(f"{path}.npy")
+        graph = hnswlib.Index(space="ip", dim=matrix.shape[1])
+        graph.load_index(f"{path}.hnsw", max_elements=max(1, len(matrix)))
+        return cls(load_passages(f"{path}.passages.json"), matrix, graph, ef or manifest["ef"])
+
+# --------------------------
+# 5. Entry points
+# --------------------------
+def build_ann_index(index, kind=ANN_INDEX, min_passages=ANN_MIN_PASSAGES):
+    if kind == "none" or len(index) < min_passages:
+        return index
+    if kind == "ivf":
+        return IVFIndex.build(index)
+    if kind == "hnsw":
+        return HNSWIndex.build(index)
+    raise ValueError(f"Unknown ANN index: {kind} (expected none or one of {', '.join(ANN_KINDS)})")
+
+def load_ann_index(path):
+    with open(f"{path}.json", "r", encoding="utf-8") as f:
+        kind = json.load(f)["kind"]
+    return (IVFIndex if kind == "ivf" else HNSWIndex).load(path)
+
+# recall@k of an ANN index against exact search, plus per-query latency
+# (queries run one at a time, as they arrive in chat). Rows are compared by
+# passage, since an IVF build reorders them.
+def recall_at_k(exact_index, ann, query_vectors, top_k):
+    exact = [set(exact_index.passages[r] for r, _ in hits) for hits in search_vectors(exact_index, query_vectors, top_k)]
+    started = time.perf_counter()
+    found = [search_vectors(ann, q, top_k)[0] for q in query_vectors]
+    elapsed = time.perf_counter() - started
+    recall = np.mean([len(e & set(ann.passages[r] for r, _ in hits)) / max(1, len(e)) for e, hits in zip(exact, found)])
+    return float(recall), elapsed / len(query_vectors) * 1000
+
+# --------------------------
+# 6. Recall / latency report on the benchmark corpus
+# --------------------------
+if __name__ == "__main__":
+    from benchmark import Corpus, build, load_model
+
+    parser = argparse.ArgumentParser(description="Report ANN recall@k and latency against exact search")
+    parser.add_argument("--passages", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--kind", choices=ANN_KINDS, default="ivf")
+    parser.add_argument("--n-probe", default="1,2,4,8,16,32", help="IVF lists probed per query")
+    parser.add_argument("--ef", default="16,32,64,128,256", help="HNSW search breadth")
+    parser.add_argument("--model", default="hash")
+    parser.add_argument("--out", help="write the report as JSON")
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    corpus = Corpus(args.passages)
+    retriever, _ = build(corpus, model)
+    exact_index = retriever.index
+    query_vectors = normalize(model.encode(corpus.queries(exact_index.passages, args.queries), convert_to_numpy=True))
+
+    exact_ms = recall_at_k(exact_index, exact_index, query_vectors, args.top_k)[1]
+    started = time.perf_counter()
+    ann = IVFIndex.build(exact_index) if args.kind == "ivf" else HNSWIndex.build(exact_index)
+    build_s = time.perf_counter() - started
+    print(f"📦 {len(exact_index)} passages | {args.kind} built in {build_s:.2f}s | exact search {exact_ms:.3f} ms/query")
+
+    report = {"passages": len(exact_index), "kind": args.kind, "build_s": build_s, "exact_ms": exact_ms, "runs": []}
+    for value in [int(v) for v in (args.n_probe if args.kind == "ivf" else args.ef).split(",")]:
+        if args.kind == "ivf":
+            ann.n_probe = value
+        else:
+            ann.ef = value
+        recall, ms = recall_at_k(exact_index, ann, query_vectors, args.top_k)
+        report["runs"].append({"param": value, f"recall@{args.top_k}": recall, "ms_per_query": ms})
+        label = "n_probe" if args.kind == "ivf" else "ef"
+        print(f"  {label}={value:<4} recall@{args.top_k} {recall:.3f}  {ms:.3f} ms/query  ({exact_ms / ms:.1f}x faster)")
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,89 @@
+import time
+import random
+import asyncio
+import argparse
+from collections import Counter
+import httpx
+from benchmark import latency_stats
+
+# --------------------------
+# 1. Settings
+# --------------------------
+# Fires requests at a running helpdesk_api.py from many concurrent clients and
+# reports throughput, latency percentiles and how many were shed (503) or
+# timed out (504). Use LLM_BACKEND=stub on the server for offline runs.
+API_URL = "http://127.0.0.1:8000"
+
+QUESTIONS = [
+    "How do I reset my password?",
+    "How can I create a new user?",
+    "How do I import data from Excel?",
+    "How do I edit a department?",
+    "Where do I change the workflow approval settings?",
+    "Why am I not getting email notifications?",
+    "How do I export the audit report?",
+    "Can I restore an archived document?",
+]
+ISSUES = [
+    "Unable to log in after password change; getting invalid credentials.",
+    "System crash while generating monthly compliance report.",
+    "Email notifications not sent for assigned tasks since yesterday.",
+    "Dashboard charts load very slowly for large projects.",
+]
+
+# --------------------------
+# 2. Load generator
+# --------------------------
+def make_request(endpoint, rng):
+    if endpoint == "summarize-ticket":
+        return {"issue": f"{rng.choice(ISSUES)} (ref {rng.randint(1, 10 ** 6)})"}
+    # A unique suffix keeps repeats from being served entirely from cache
+    question = rng.choice(QUESTIONS)
+    if endpoint == "answer" and rng.random() < 0.5:
+        question += f" Ticket {rng.randint(1, 10 ** 6)}."
+    return {"query": question, "mode": "hybrid"}
+
+async def client(http, endpoint, jobs, rng, latencies, statuses):
+    while True:
+        try:
+            jobs.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        started = time.perf_counter()
+        try:
+            response = await http.post(f"/{endpoint}", json=make_request(endpoint, rng))
+            statuses[response.status_code] += 1
+            if response.status_code == 200:
+                latencies.append(time.perf_counter() - started)
+        except httpx.HTTPError as exc:
+            statuses[type(exc).__name__] += 1
+
+async def run(url, endpoint, concurrency, requests, seed):
+    rng = random.Random(seed)
+    jobs = asyncio.Queue()
+    for i in range(requests):
+        jobs.put_nowait(i)
+    latencies, statuses = [], Counter()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120.0) as http:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(http, endpoint, jobs, rng, latencies, statuses) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return elapsed, latencies, statuses
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default=API_URL)
+    parser.add_argument("--endpoint", choices=("search", "answer", "summarize-ticket"), default="answer")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    elapsed, latencies, statuses = asyncio.run(run(args.url, args.endpoint, args.concurrency, args.requests, args.seed))
+    print(f"🚦 {args.requests} /{args.endpoint} requests from {args.concurrency} clients in {elapsed:.2f}s "
+          f"({args.requests / elapsed:.1f} req/s)")
+    print(f"   status codes: {dict(statuses)}")
+    if latencies:
+        stats = latency_stats(latencies)
+        print(f"   ok latency: p50 {stats['p50_ms']:.0f} ms, p95 {stats['p95_ms']:.0f} ms, p99 {stats['p99_ms']:.0f} ms")
@@ -1,14 +1,28 @@
-import os
-os.system("pip install groq>=0.6.0")
-
+import time
+import sqlite3
+from contextlib import closing
 import streamlit as st
-from groq import Groq
-from sentence_transformers import SentenceTransformer, util
+import metrics
+from startup import in_background, load_embedding_model, startup
+from embedding_service import BatchingEncoder
+from keyword_index import snippet
+from semantic_cache import SemanticCache
+from llm_cache import ResponseCache
+from docs_watcher import DocsWatcher, LiveIndex
+from doc_ingest import IngestStats, load_docs
+from llm_gateway import call_log, default_model, stream_chat
+from interaction_log import log_interaction
+from context_builder import Conversation, build_messages
+from retrieval import SEARCH_MODES
+from support_db import DB_PATH, connect
+from ticket_index import load_ticket_index, ticket_matches
 
 # --------------------------
 # 1. Page Setup
 # --------------------------
 st.set_page_config(page_title="Effivity Helpdesk AI", page_icon="💡", layout="centered")
+# Started once per server process; reruns find it already listening
+metrics.start_metrics_server()
 
 # Custom CSS for clean UI
 st.markdown(
@@ -61,55 +75,95 @@ st.markdown(
 # --------------------------
 # 3. Load Documents
 # --------------------------
+# docs/ is read recursively (txt, md, html, docx, pdf); see doc_ingest.py
 DOCS_FOLDER = "docs"
 
+# Edits, additions and removals in docs/ are picked up by a background
+# watcher, which swaps in a new snapshot of docs and indexes
 @st.cache_resource
-def load_docs():
-    docs = {}
-    for file_name in os.listdir(DOCS_FOLDER):
-        if file_name.endswith(".txt"):
-            with open(os.path.join(DOCS_FOLDER, file_name), "r", encoding="utf-8") as f:
-                docs[file_name] = f.read()
-    return docs
+def get_live_index():
+    ingest_stats = IngestStats()
+    with startup.phase("load docs"):
+        docs = load_docs(DOCS_FOLDER, stats=ingest_stats)
+    print(ingest_stats.report())
+    with startup.phase("keyword index"):
+        live = LiveIndex(docs, DOCS_FOLDER)
+    DocsWatcher(live, DOCS_FOLDER).start()
+    return live
 
-docs = load_docs()
+live = get_live_index()
 
-# --------------------------
-# 4. Build Embeddings
-# --------------------------
+# Shared by all sessions; answers are dropped when the docs change
 @st.cache_resource
-def build_embeddings():
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    embeddings = {name: model.encode(text, convert_to_tensor=True) for name, text in docs.items()}
-    return model, embeddings
+def get_response_cache():
+    cache = ResponseCache(docs_version=live.snapshot.version)
+    live.listeners.append(lambda snap: cache.set_docs_version(snap.version))
+    return cache
 
-model, embeddings = build_embeddings()
+response_cache = get_response_cache()
 
 # --------------------------
-# 5. Semantic Search
+# 4. Build Embedding Index
 # --------------------------
-def semantic_search(query, model, docs, embeddings, top_k=2):
-    q_emb = model.encode(query, convert_to_tensor=True)
-    scores = {n: util.cos_sim(q_emb, emb).item() for n, emb in embeddings.items()}
-    ranked = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-    return [(n, docs[n]) for n, _ in ranked[:top_k]]
+def build_embeddings():
+    # Concurrent sessions' query encodes are coalesced into batched forward passes
+    model = BatchingEncoder(load_embedding_model())
+    # Unchanged docs are loaded from the on-disk cache instead of re-encoded
+    with startup.phase("passage index"):
+        live.attach_model(model)
+    # Similar past tickets and their resolutions ground answers next to the docs
+    try:
+        with startup.phase("ticket index"), closing(connect(DB_PATH)) as conn:
+            return load_ticket_index(conn, model)
+    except sqlite3.Error as exc:
+        print(f"⚠️ Similar-ticket search unavailable: {exc}")
+        return None
+
+# torch and the model load on a background thread so the page is usable at
+# once; until they are ready questions are answered from keyword search
+@st.cache_resource
+def start_warmup():
+    return in_background("embedding-warmup", build_embeddings)
+
+warmup = start_warmup()
+# One consistent view of docs and indexes for this whole script run
+snapshot = live.snapshot
+keyword_index = snapshot.keyword_index
+retriever = snapshot.retriever
+tickets = warmup.result() if warmup.done() and warmup.exception() is None else None
+
+# Paraphrased repeat questions from any session are answered from here
+@st.cache_resource
+def get_answer_cache(dim):
+    cache = SemanticCache(dim)
+    live.listeners.append(lambda snap: cache.clear())
+    return cache
+
+answer_cache = get_answer_cache(retriever.index.dim) if retriever else None
+
+search_mode = st.sidebar.selectbox("Search mode", SEARCH_MODES, index=SEARCH_MODES.index("hybrid"))
+if not warmup.done():
+    st.sidebar.info("🧠 Semantic search is warming up; answering from keyword search for now.")
+elif warmup.exception() is not None:
+    st.sidebar.error(f"Semantic search unavailable, using keyword search: {warmup.exception()}")
 
 # --------------------------
-# 6. Ask Groq AI
+# 5. Ask the AI
 # --------------------------
-def ask_ai(query, context, history):
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-    messages = [{"role": "system", "content": "You are an Effivity support assistant using product documentation."}]
-    messages += history
-    messages.append({"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{query}"})
-    res = client.chat.completions.create(model="llama-3.1-8b-instant", messages=messages)
-    return res.choices[0].message.content.strip()
+# Passages and history are trimmed to fit PROMPT_TOKEN_BUDGET
+def ask_ai(query, matches, conversation, cache=None):
+    system_prompt = "You are an Effivity support assistant using product documentation and similar past tickets."
+    messages = build_messages(system_prompt, query, matches, conversation)
+    return stream_chat(messages, cache=cache)
 
 # --------------------------
-# 7. Chat Interface
+# 6. Chat Interface
 # --------------------------
+# history is what the page shows; conversation is what the model sees, with
+# older turns folded into a rolling summary in the background
 if "history" not in st.session_state:
     st.session_state.history = []
+    st.session_state.conversation = Conversation()
 
 # Welcome message
 if not st.session_state.history:
@@ -117,20 +171,110 @@ if not st.session_state.history:
         "👋 Hi, I’m your **Effivity Helpdesk AI Assistant**. Ask me anything about Effivity features, workflows, or setup."
     )
 
+def show_message(role, content, target=st):
+    if role == "user":
+        target.markdown(f"<div class='chat-box user-msg'>{content} 🧑‍💼</div>", unsafe_allow_html=True)
+    else:
+        target.markdown(f"<div class='chat-box ai-msg'>💡 {content}</div>", unsafe_allow_html=True)
+
+# Display chat messages
+for msg in st.session_state.history:
+    show_message(msg["role"], msg["content"])
+
 query = st.chat_input("Type your question here...")
 
 if query:
-    matches = semantic_search(query, model, docs, embeddings)
-    context = "\n---\n".join([f"{n}:\n{text[:800]}" for n, text in matches])
-    answer = ask_ai(query, context, st.session_state.history)
+    started = time.perf_counter()
+    show_message("user", query)
+
+    if retriever:
+        # The query embedding is shared by retrieval and the semantic answer cache
+        query_vector = retriever.encode(query)
+        hits = retriever.search(query, search_mode, query_vector=query_vector)
+        matches = [(p.doc, p.text) for p, _ in hits]
+        scores = [(p.doc, score) for p, score in hits]
+        similar = []
+        if tickets is not None:
+            # Picks up tickets the summarizer has ingested since the last question
+            with closing(connect(DB_PATH)) as conn:
+                tickets.refresh(conn)
+                similar = tickets.similar(conn, query_vector)
+            matches += ticket_matches(similar)
+        doc_set = frozenset(n for n, _ in matches)
+        answer = answer_cache.lookup(query_vector, doc_set, query, st.session_state.history)
+    else:
+        keyword_hits = keyword_index.search(query, top_k=2)
+        matches = [(n, snippet(keyword_index, n, offset, snippet_chars=500)) for n, _, offset in keyword_hits]
+        scores = [(n, score) for n, score, _ in keyword_hits]
+        similar = []
+        answer = None
+    retrieved = time.perf_counter() - started
+    placeholder = st.empty()
+
+    # Stays None if the stream ends without a single token
+    ttft = None
+    if answer is None:
+        # Render tokens as they arrive; the full answer is kept for history
+        parts = []
+        for chunk in ask_ai(query, matches, st.session_state.conversation, response_cache):
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            parts.append(chunk)
+            show_message("assistant", "".join(parts) + " ▌", placeholder)
+        answer = "".join(parts).strip()
+        if retriever:
+            answer_cache.store(query_vector, doc_set, query, answer, st.session_state.history)
+    else:
+        ttft = time.perf_counter() - started
+    st.session_state.last_ttft = ttft
+    show_message("assistant", answer, placeholder)
+    timings = {"retrieve": retrieved, "first_token": ttft, "total": time.perf_counter() - started}
+    mode = search_mode if retriever else "keyword-warmup"
+    log_interaction(query, scores, answer, default_model(), timings, mode=mode,
+                    similar_tickets=[(t["ticket_id"], round(float(t["score"]), 4)) for t in similar])
 
     # Add to chat history
     st.session_state.history.append({"role": "user", "content": query})
     st.session_state.history.append({"role": "assistant", "content": answer})
+    st.session_state.conversation.add_turn(query, answer)
 
-# Display chat messages
-for msg in st.session_state.history:
-    if msg["role"] == "user":
-        st.markdown(f"<div class='chat-box user-msg'>{msg['content']} 🧑‍💼</div>", unsafe_allow_html=True)
-    else:
-        st.markdown(f"<div class='chat-box ai-msg'>💡 {msg['content']}</div>", unsafe_allow_html=True)
+cache_stats = response_cache.stats()
+st.sidebar.caption(
+    f"💾 Response cache: {cache_stats['hits']} hits / {cache_stats['misses']} misses "
+    f"({cache_stats['hit_rate']:.0%})"
+)
+if retriever:
+    batch_stats = retriever.model.stats()
+    st.sidebar.caption(
+        f"🧮 Query embeddings: {batch_stats['queries']} in {batch_stats['batches']} batches "
+        f"(avg {batch_stats['avg_batch']:.1f})"
+    )
+if tickets is not None:
+    st.sidebar.caption(f"🗂️ Similar-ticket search over {len(tickets)} past ticket(s)")
+if answer_cache:
+    semantic_stats = answer_cache.stats()
+    st.sidebar.caption(
+        f"🧲 Semantic cache: {semantic_stats['hits']} hits / {semantic_stats['misses']} misses "
+        f"({semantic_stats['hit_rate']:.0%}), {semantic_stats['entries']} stored"
+    )
+llm_stats = call_log.summary()
+if st.session_state.get("last_ttft") is not None:
+    ttft_line = f"⏱️ First token: {st.session_state.last_ttft:.2f}s"
+    if "ttft_p50" in llm_stats:
+        ttft_line += f" (LLM p50 {llm_stats['ttft_p50']:.2f}s, p95 {llm_stats['ttft_p95']:.2f}s)"
+    st.sidebar.caption(ttft_line)
+
+# Per-stage latency since the server started (METRICS_ENABLED=0 hides it)
+if metrics.registry.enabled:
+    stages, counters = metrics.registry.snapshot()
+    if stages:
+        with st.sidebar.expander("📈 Stage timings"):
+            st.table([
+                {"stage": stage, "count": stats["count"],
+                 **{k: f"{stats[k] * 1000:.0f} ms" for k in ("p50", "p95", "p99")}}
+                for stage, stats in sorted(stages.items())
+            ])
+            st.caption(", ".join(f"{name}: {value}" for name, value in sorted(counters.items())))
+
+with st.sidebar.expander("🚀 Startup"):
+    st.code(startup.report(), language=None)
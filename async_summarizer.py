@@ -0,0 +1,217 @@
+import os
+import time
+import random
+import asyncio
+from llm_gateway import acomplete, cache_model_key, default_model
+
+# --------------------------
+# 1. Settings
+# --------------------------
+# Set LLM_BACKEND=stub and run stub_llm_server.py to test the pipeline offline.
+SUMMARY_MODEL = default_model()
+MAX_CONCURRENCY = int(os.getenv("SUMMARIZER_CONCURRENCY", "8"))
+REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "30"))
+TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "6000"))
+MAX_COMPLETION_TOKENS = 400
+MAX_RETRIES = 6
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+# similar is an optional list of (label, text) past tickets and how they
+# were resolved, so the recommendation can build on what already worked
+def build_summary_prompt(issue, similar=None):
+    prompt = f"""
+    You are a senior tech support assistant.
+    Summarize this ticket clearly:
+    1. Problem Summary
+    2. Possible Root Cause
+    3. Recommended Action
+
+    Ticket:
+    {issue}
+    """
+    if similar:
+        past = "\n\n".join(f"[{label}]\n{text}" for label, text in similar)
+        prompt += f"""
+    Similar past tickets (use them only where they apply):
+    {past}
+    """
+    return prompt
+
+def add_rate_limit_args(parser):
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY)
+    parser.add_argument("--rpm", type=int, default=REQUESTS_PER_MINUTE, help="provider requests/minute limit")
+    parser.add_argument("--tpm", type=int, default=TOKENS_PER_MINUTE, help="provider tokens/minute limit")
+
+# --------------------------
+# 2. Token-bucket rate limiting
+# --------------------------
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Waiters queue on the lock, so they are served in arrival order
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        async with self.lock:
+            self.refill()
+            while self.tokens < amount:
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+                self.refill()
+            self.tokens -= amount
+
+    # Charge usage the estimate missed; the bucket may go negative
+    def debit(self, amount):
+        self.refill()
+        self.tokens -= amount
+
+def estimate_tokens(prompt):
+    return len(prompt) // 4 + MAX_COMPLETION_TOKENS
+
+# --------------------------
+# 3. Retries with exponential backoff
+# --------------------------
+def is_retryable(exc):
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS
+    return isinstance(exc, (asyncio.TimeoutError, ConnectionError)) or type(exc).__name__ in (
+        "APIConnectionError", "APITimeoutError"
+    )
+
+def retry_delay(attempt, exc):
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(60.0, 2 ** attempt) * random.uniform(0.5, 1.0)
+
+# --------------------------
+# 4. Progress / throughput report
+# --------------------------
+class Progress:
+    def __init__(self, every=5.0):
+        self.started = time.monotonic()
+        self.last_report = self.started
+        self.every = every
+        self.done = 0
+        self.failed = 0
+        self.retries = 0
+        self.cached = 0
+        self.tokens = 0
+
+    def report(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.last_report < self.every:
+            return
+        self.last_report = now
+        elapsed = max(now - self.started, 1e-9)
+        print(
+            f"📈 {self.done} done ({self.cached} cached), {self.failed} failed, {self.retries} retries | "
+            f"{self.done / elapsed:.2f} tickets/s | {self.tokens * 60 / elapsed:.0f} tokens/min"
+        )
+
+    def stats(self):
+        elapsed = time.monotonic() - self.started
+        return {
+            "done": self.done,
+            "failed": self.failed,
+            "retries": self.retries,
+            "cached": self.cached,
+            "tokens": self.tokens,
+            "seconds": round(elapsed, 2),
+        }
+
+# --------------------------
+# 5. Concurrent pipeline
+# --------------------------
+async def summarize_one(issue, model, requests, tokens, progress, cache=None, similar=None):
+    prompt = build_summary_prompt(issue, similar)
+    messages = [{"role": "user", "content": prompt}]
+    cached = cache.get(cache_model_key(model), messages) if cache else None
+    if cached is not None:
+        progress.cached += 1
+        return cached
+
+    estimate = estimate_tokens(prompt)
+    for attempt in range(MAX_RETRIES + 1):
+        await requests.acquire()
+        await tokens.acquire(estimate)
+        try:
+            response = await acomplete(messages, model, max_tokens=MAX_COMPLETION_TOKENS)
+        except Exception as exc:
+            if attempt == MAX_RETRIES or not is_retryable(exc):
+                raise
+            progress.retries += 1
+            await asyncio.sleep(retry_delay(attempt, exc))
+            continue
+
+        used = response.usage.total_tokens if response.usage else estimate
+        if used > estimate:
+            tokens.debit(used - estimate)
+        progress.tokens += used
+        summary = response.choices[0].message.content.strip()
+        if cache:
+            cache.put(cache_model_key(model), messages, summary)
+        return summary
+
+# tickets is any iterable of dicts with TicketID / Customer / Issue keys, plus
+# an optional Similar list of past tickets for the prompt. It is consumed
+# lazily through a bounded queue, so a streaming reader can feed it; the
+# iteration runs on a worker thread, so parsing the export or embedding
+# tickets while producing them never stalls the requests in flight.
+# on_result(ticket, summary) runs on the event loop for each success; if it
+# raises, the ticket counts as failed. Identical tickets already in the
+# response cache skip the LLM and the rate limiter.
+async def summarize_tickets(tickets, on_result=None, concurrency=MAX_CONCURRENCY,
+                            rpm=REQUESTS_PER_MINUTE, tpm=TOKENS_PER_MINUTE, model=SUMMARY_MODEL, cache=None):
+    requests = TokenBucket(rpm)
+    tokens = TokenBucket(tpm)
+    progress = Progress()
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    loop = asyncio.get_running_loop()
+
+    async def worker():
+        while True:
+            ticket = await queue.get()
+            if ticket is None:
+                return
+            try:
+                summary = await summarize_one(
+                    ticket["Issue"], model, requests, tokens, progress, cache, ticket.get("Similar")
+                )
+                if on_result:
+                    on_result(ticket, summary)
+            except Exception as exc:
+                progress.failed += 1
+                print(f"❌ Ticket {ticket.get('TicketID')} failed: {exc}")
+            else:
+                progress.done += 1
+            progress.report()
+
+    def produce():
+        for ticket in tickets:
+            asyncio.run_coroutine_threadsafe(queue.put(ticket), loop).result()
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.to_thread(produce)
+    finally:
+        # Workers drain what was queued even if the reader failed
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+
+    progress.report(force=True)
+    return progress.stats()
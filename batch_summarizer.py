@@ -1,31 +1,24 @@
-import pandas as pd
-import os
-from groq import Groq
+import asyncio
+import argparse
+from metrics import start_metrics_server
+from async_summarizer import add_rate_limit_args, summarize_tickets
+from llm_cache import ResponseCache
+from ticket_reader import iter_tickets
 
-# Initialize Groq client
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+parser = argparse.ArgumentParser()
+parser.add_argument("path", nargs="?", default="sample_tickets.xlsx", help="ticket export (.xlsx, .csv or .parquet)")
+add_rate_limit_args(parser)
+args = parser.parse_args()
+start_metrics_server()
 
-# Read tickets from Excel file
-df = pd.read_excel("sample_tickets.xlsx")
-
-for _, t in df.iterrows():
-    prompt = f"""
-    You are a senior tech support assistant.
-    Summarize this ticket briefly:
-    1. Problem Summary
-    2. Possible Root Cause
-    3. Recommended Action
-
-    Ticket:
-    {t['Issue']}
-    """
-
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}]
-    )
-
-    summary = response.choices[0].message.content.strip()
+def print_summary(t, summary):
     print(f"\n🧾 Ticket {t['TicketID']} - {t['Customer']}")
     print(summary)
     print("-" * 60)
+
+# Tickets are streamed from the export in batches; summaries are requested
+# concurrently and printed as they complete
+asyncio.run(summarize_tickets(
+    iter_tickets(args.path), on_result=print_summary,
+    concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm, cache=ResponseCache()
+))
@@ -1,71 +1,120 @@
-import pandas as pd
-import os
-import sqlite3
-from groq import Groq
+import asyncio
+import argparse
+from metrics import start_metrics_server
+from async_summarizer import SUMMARY_MODEL, add_rate_limit_args, summarize_tickets
+from support_db import SAVE_SUMMARY_SQL, BatchWriter, connect, pending_tickets, upsert_tickets
+from llm_cache import ResponseCache
+from ticket_reader import iter_ticket_batches
+from ticket_index import SIMILAR_TICKETS, embed_tickets, find_duplicate, load_ticket_index, ticket_matches
 
 # -----------------------------
 # 1. Setup
 # -----------------------------
 DB_PATH = "ai_support_knowledge.db"
 EXCEL_PATH = "sample_tickets.xlsx"
+CHECKPOINT_EVERY = 25
 
-# Connect to database
-conn = sqlite3.connect(DB_PATH)
-cursor = conn.cursor()
+parser = argparse.ArgumentParser()
+parser.add_argument("path", nargs="?", default=EXCEL_PATH, help="ticket export (.xlsx, .csv or .parquet)")
+add_rate_limit_args(parser)
+parser.add_argument("--resume", action="store_true",
+                    help="skip reading the export and only summarize tickets already in the DB without a summary")
+parser.add_argument("--no-similar", action="store_true",
+                    help="skip ticket embeddings: no duplicate reuse and no past tickets in the prompt")
+args = parser.parse_args()
+start_metrics_server()
 
-# Initialize Groq client
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+# Connect to database (creates/upgrades the schema if needed). Tickets are
+# read, upserted and embedded on the summarizer's producer thread, so that
+# side gets its own connection; results are stored from the event loop.
+conn = connect(DB_PATH, check_same_thread=False)
+results_conn = connect(DB_PATH)
+ingested = {"read": 0, "added": 0, "reused": 0}
 
-# -----------------------------
-# 2. Read Excel data
-# -----------------------------
-df = pd.read_excel(EXCEL_PATH)
+# Summaries are written with executemany and committed every CHECKPOINT_EVERY
+# rows, so a crash only loses the last batch and readers are never blocked long
+summaries = BatchWriter(results_conn, SAVE_SUMMARY_SQL, CHECKPOINT_EVERY)
+reused = BatchWriter(conn, SAVE_SUMMARY_SQL, CHECKPOINT_EVERY)
+
+def as_ticket(row):
+    ticket_id, source_id, customer, issue = row
+    return {"id": ticket_id, "TicketID": source_id, "Customer": customer, "Issue": issue}
 
 # -----------------------------
-# 3. Process each ticket
+# 2. Similar past tickets
 # -----------------------------
-for _, row in df.iterrows():
-    customer = row["Customer"]
-    issue = row["Issue"]
-
-    # Insert original ticket into database
-    cursor.execute(
-        "INSERT INTO tickets (customer_name, issue_text) VALUES (?, ?)",
-        (customer, issue)
-    )
-    ticket_id = cursor.lastrowid
+# Every ticket is embedded as it is ingested. A near-duplicate of a ticket
+# that already has a summary reuses that summary without an LLM call; the
+# rest get their closest past tickets added to the prompt.
+model = tickets_index = None
+if not args.no_similar:
+    try:
+        from startup import load_embedding_model
+        model = load_embedding_model()
+        tickets_index = load_ticket_index(conn, model)
+        print(f"🗂️ {len(tickets_index)} past ticket(s) indexed for similarity search.")
+    except ImportError as exc:
+        print(f"⚠️ Similar-ticket search disabled ({exc}); summarizing every ticket from scratch.")
 
-    # Create AI prompt
-    prompt = f"""
-    You are a senior tech support assistant.
-    Summarize this ticket clearly:
-    1. Problem Summary
-    2. Possible Root Cause
-    3. Recommended Action
+def with_similar(rows):
+    if tickets_index is None:
+        yield from (as_ticket(row) for row in rows)
+        return
+    vectors = embed_tickets(conn, model, [(row[0], row[3]) for row in rows])
+    tickets_index.refresh(conn)
+    for row in rows:
+        ticket = as_ticket(row)
+        similar = tickets_index.similar(conn, vectors[ticket["id"]], SIMILAR_TICKETS,
+                                        exclude={ticket["id"]}, summary_model=SUMMARY_MODEL)
+        duplicate = find_duplicate(similar)
+        if duplicate:
+            ingested["reused"] += 1
+            reused.add((ticket["id"], duplicate["summary"], SUMMARY_MODEL))
+            print(f"♻️ Ticket {ticket['TicketID']} matches ticket {duplicate['source_ticket_id'] or duplicate['ticket_id']} "
+                  f"({duplicate['score']:.2f}); reused its summary")
+            continue
+        ticket["Similar"] = ticket_matches(similar)
+        yield ticket
 
-    Ticket:
-    {issue}
-    """
+# -----------------------------
+# 3. Stream tickets in, keyed by source TicketID
+# -----------------------------
+# Each batch is upserted and its unsummarized tickets are handed straight to
+# the summarizer, so LLM calls start before the export is fully read.
+def ingest_pending(path):
+    for batch in iter_ticket_batches(path):
+        rows = [(str(t["TicketID"]), t["Customer"], t["Issue"]) for t in batch]
+        ingested["read"] += len(rows)
+        ingested["added"] += upsert_tickets(conn, rows)
+        yield from with_similar(pending_tickets(conn, SUMMARY_MODEL, [r[0] for r in rows]))
 
-    # Get AI response
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    ai_output = response.choices[0].message.content.strip()
+if args.resume:
+    pending = pending_tickets(conn, SUMMARY_MODEL)
+    print(f"🧮 Resuming {len(pending)} ticket(s) without a {SUMMARY_MODEL} summary.")
+    tickets = with_similar(pending)
+else:
+    tickets = ingest_pending(args.path)
 
-    # -----------------------------
-    # 4. Save AI result to database
-    # -----------------------------
-    cursor.execute(
-        "INSERT INTO ai_summaries (ticket_id, ai_summary, model_used) VALUES (?, ?, ?)",
-        (ticket_id, ai_output, "llama-3.1-8b-instant")
-    )
+# -----------------------------
+# 4. Summarize only tickets lacking a summary for this model
+# -----------------------------
+def store(ticket, ai_output):
+    summaries.add((ticket["id"], ai_output, SUMMARY_MODEL))
+    print(f"✅ Ticket {ticket['TicketID']} processed for {ticket['Customer']}")
 
-    print(f"✅ Ticket {ticket_id} processed for {customer}")
+stats = asyncio.run(summarize_tickets(
+    tickets, on_result=store,
+    concurrency=args.concurrency, rpm=args.rpm, tpm=args.tpm, cache=ResponseCache()
+))
 
-# Commit and close
-conn.commit()
+# Flush the last partial batches and close
+summaries.flush()
+reused.flush()
+results_conn.close()
 conn.close()
 
-print("\n🎉 All tickets processed and stored in ai_support_knowledge.db")
+if not args.resume:
+    print(f"\n📥 {ingested['added']} new ticket(s) ingested, {ingested['read'] - ingested['added']} already known.")
+if ingested["reused"]:
+    print(f"♻️ {ingested['reused']} near-duplicate ticket(s) reused an existing summary without an LLM call.")
+print(f"🎉 {stats['done']} tickets processed and stored in ai_support_knowledge.db ({stats['failed']} failed)")
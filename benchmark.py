@@ -0,0 +1,353 @@
+import gc
+import os
+import json
+import time
+import random
+import shutil
+import hashlib
+import argparse
+import platform
+import datetime
+import tempfile
+import threading
+import subprocess
+import tracemalloc
+import numpy as np
+
+# Builds go through the same cache and store as the apps, but in files of
+# their own: the hash encoder's vectors must never reach the app's cache.
+# Set before the imports below, which read them.
+os.environ["EMBED_CACHE_PATH"] = os.getenv("BENCH_EMBED_CACHE_PATH", "benchmark_embeddings.db")
+os.environ["EMBED_STORE_DIR"] = os.getenv("BENCH_EMBED_STORE_DIR", "benchmark_store")
+
+from metrics import percentile
+from doc_ingest import ingest
+from embedding_cache import EMBED_CACHE_PATH
+from vector_store import EMBED_STORE_DIR
+from retrieval import (
+    ANN_INDEX, EMBED_STORE_DTYPE, PASSAGE_OVERLAP, PASSAGE_WORDS, HybridRetriever, check_index_settings, normalize,
+    search_vectors,
+)
+
+# --------------------------
+# 1. Settings
+# --------------------------
+# python benchmark.py --sizes 100,1000,10000 --out before.json
+# python benchmark.py --sizes 100,1000,10000 --out after.json --compare before.json
+DEFAULT_SIZES = "100,1000,10000"
+QUERIES_PER_SIZE = 200
+E2E_TURNS = 20
+# tracemalloc slows builds several times over, so memory is measured in a
+# separate pass and skipped for the largest corpora
+MEMORY_MAX_PASSAGES = 200000
+PASSAGES_PER_DOC = 10
+# Each doc draws most of its words from one topic's own ranking of the
+# vocabulary, so embeddings cluster the way real help articles do
+N_TOPICS = 64
+TOPIC_SHARE = 0.7
+HASH_DIM = 384
+
+BASE_TERMS = (
+    "password reset login domain email link account user role permission department "
+    "audit report dashboard import export excel template workflow approval document "
+    "version upload download sync mobile browser cache error timeout license renewal "
+    "invoice billing subscription module calibration risk incident action nonconformity "
+    "training record schedule reminder notification settings admin profile language "
+    "date format field mandatory filter search archive restore delete edit create view"
+).split()
+FILLER = "the a to of and in for on with your is it you can this from by be click select then".split()
+
+# --------------------------
+# 2. Synthetic corpus and queries
+# --------------------------
+# Term frequencies follow a Zipf curve over the help-desk terms plus generated
+# rare terms, so BM25 postings have a realistic long tail. Same seed, same data.
+class Corpus:
+    def __init__(self, n_passages, seed=0, rare_terms=20000):
+        self.rng = random.Random(seed)
+        self.vocab = BASE_TERMS + [f"{self.rng.choice(BASE_TERMS)[:4]}{i}" for i in range(rare_terms)]
+        weights = 1.0 / np.arange(1, len(self.vocab) + 1) ** 1.1
+        self.cumulative = np.cumsum(weights / weights.sum())
+        self.np_rng = np.random.default_rng(seed)
+        self.topics = [self.np_rng.permutation(len(self.vocab)) for _ in range(N_TOPICS)]
+        self.docs = {}
+        # Exactly PASSAGES_PER_DOC overlapping passages per doc
+        words_per_doc = (PASSAGE_WORDS - PASSAGE_OVERLAP) * (PASSAGES_PER_DOC - 1) + PASSAGE_WORDS
+        for d in range(max(1, n_passages // PASSAGES_PER_DOC)):
+            self.docs[f"Effivity - Synthetic Guide {d:07d}.txt"] = self.text(words_per_doc, self.rng.randrange(N_TOPICS))
+
+    def words(self, n, topic=None):
+        picks = np.searchsorted(self.cumulative, self.np_rng.random(n))
+        if topic is not None:
+            on_topic = self.np_rng.random(n) < TOPIC_SHARE
+            picks[on_topic] = self.topics[topic][picks[on_topic]]
+        return [self.vocab[i] for i in picks]
+
+    def text(self, n_words, topic=None):
+        out = []
+        for word in self.words(n_words, topic):
+            out.append(word)
+            if self.rng.random() < 0.4:
+                out.append(self.rng.choice(FILLER))
+        return " ".join(out[:n_words])
+
+    # Half the queries quote words from a real passage, half are free-form
+    def queries(self, passages, n):
+        queries = []
+        for i in range(n):
+            if i % 2 == 0 and passages:
+                words = self.rng.choice(passages).text.split()
+                start = self.rng.randrange(max(1, len(words) - 6))
+                queries.append("how do I " + " ".join(words[start:start + self.rng.randint(3, 6)]))
+            else:
+                queries.append(" ".join(self.words(self.rng.randint(2, 6), self.rng.randrange(N_TOPICS))))
+        return queries
+
+# Deterministic bag-of-words hashing encoder with the sentence-transformers
+# encode() signature. It keeps 1M-passage runs feasible on a laptop and makes
+# results independent of model downloads; pass --model to use a real model.
+class HashEncoder:
+    def __init__(self, dim=HASH_DIM):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def encode(self, texts, batch_size=64, convert_to_numpy=True, **kwargs):
+        single = isinstance(texts, str)
+        texts = [texts] if single else texts
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in text.lower().split():
+                h = int.from_bytes(hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 32) & 1 else -1.0
+        return out[0] if single else out
+
+def load_model(name):
+    if name == "hash":
+        return HashEncoder()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(name)
+
+# --------------------------
+# 3. Measurements
+# --------------------------
+def latency_stats(seconds):
+    values = sorted(seconds)
+    total = sum(values)
+    return {
+        "n": len(values),
+        "p50_ms": percentile(values, 0.5) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "mean_ms": total / len(values) * 1000,
+        "qps": len(values) / total if total else None,
+    }
+
+def time_each(fn, items):
+    seconds = []
+    for item in items:
+        started = time.perf_counter()
+        fn(item)
+        seconds.append(time.perf_counter() - started)
+    return latency_stats(seconds)
+
+def write_corpus(corpus, folder):
+    for name, text in corpus.docs.items():
+        with open(os.path.join(folder, name), "w", encoding="utf-8") as f:
+            f.write(text)
+
+def clear_caches():
+    if os.path.exists(EMBED_CACHE_PATH):
+        os.remove(EMBED_CACHE_PATH)
+    shutil.rmtree(EMBED_STORE_DIR, ignore_errors=True)
+
+# The apps' startup path: doc_ingest.ingest reads and splits the files,
+# encodes through the embedding cache and builds the configured index
+def build(folder, model, store_dtype, ann):
+    started = time.perf_counter()
+    _, index, stats = ingest(model, folder, store_dtype=store_dtype, ann=ann)
+    timings = {"ingest_s": time.perf_counter() - started, "encoded": stats.encoded}
+
+    started = time.perf_counter()
+    retriever = HybridRetriever(model, index)
+    timings["keyword_index_s"] = time.perf_counter() - started
+    timings["total_s"] = timings["ingest_s"] + timings["keyword_index_s"]
+    return retriever, timings
+
+# Cold: empty cache and store, so every passage is encoded (first start or a
+# new model). Warm: the same folder again, as every later start sees it.
+def build_cold_and_warm(folder, model, store_dtype, ann):
+    clear_caches()
+    _, cold = build(folder, model, store_dtype, ann)
+    gc.collect()
+    retriever, warm = build(folder, model, store_dtype, ann)
+    return retriever, {"cold": cold, "warm": warm}
+
+# Float16/int8 vectors are memory-mapped, so only the codes count as resident
+def measure_memory(folder, model, store_dtype, ann):
+    gc.collect()
+    tracemalloc.start()
+    retriever, _ = build(folder, model, store_dtype, ann)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    index = retriever.index
+    return {
+        "matrix_mb": (index.resident_bytes() if hasattr(index, "resident_bytes") else index.matrix.nbytes) / 1e6,
+        "index_total_mb": current / 1e6,
+        "build_peak_mb": peak / 1e6,
+    }
+
+def bench_retrieval(corpus, model, retriever, n_queries):
+    queries = corpus.queries(retriever.index.passages, n_queries)
+    query_vectors = normalize(model.encode(queries, convert_to_numpy=True))
+    result = {"passages": len(retriever.index), "docs": len(corpus.docs)}
+
+    result["query_encode"] = time_each(lambda q: model.encode(q, convert_to_numpy=True), queries)
+    result["keyword"] = time_each(lambda q: retriever.keyword_hits(q, 3), queries)
+    result["semantic"] = time_each(lambda v: retriever.dense_hits(v, 3), query_vectors)
+    pairs = list(zip(queries, query_vectors))
+    result["hybrid"] = time_each(lambda qv: retriever.search(qv[0], "hybrid", 3, qv[1]), pairs)
+
+    # One matrix product for the whole query set, as semantic_search_batch does
+    started = time.perf_counter()
+    search_vectors(retriever.index, query_vectors, 3)
+    elapsed = time.perf_counter() - started
+    result["semantic_batch"] = {"n": len(queries), "total_ms": elapsed * 1000, "qps": len(queries) / elapsed}
+    return result
+
+# Retrieval + prompt assembly + streamed completion against stub_llm_server
+def bench_end_to_end(corpus, retriever, turns, llm_latency, token_delay):
+    import llm_gateway
+    from context_builder import build_messages
+    from stub_llm_server import serve
+
+    server = serve(port=0, latency=llm_latency, token_delay=token_delay)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    llm_gateway.STUB_LLM_URL = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    llm_gateway.clients.pop("stub", None)
+
+    first_tokens, totals, retrieves = [], [], []
+    try:
+        for query in corpus.queries(retriever.index.passages, turns):
+            started = time.perf_counter()
+            hits = retriever.search(query, "hybrid", 3)
+            retrieves.append(time.perf_counter() - started)
+            messages = build_messages("You are an Effivity support assistant.", query,
+                                      [(p.doc, p.text) for p, _ in hits])
+            first_token = None
+            for _ in llm_gateway.stream_chat(messages, backend="stub"):
+                if first_token is None:
+                    first_token = time.perf_counter() - started
+            first_tokens.append(first_token or 0.0)
+            totals.append(time.perf_counter() - started)
+    finally:
+        server.shutdown()
+        server.server_close()
+    return {
+        "llm_latency_s": llm_latency,
+        "token_delay_s": token_delay,
+        "retrieve": latency_stats(retrieves),
+        "first_token": latency_stats(first_tokens),
+        "total": latency_stats(totals),
+    }
+
+# --------------------------
+# 4. Reporting
+# --------------------------
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Flat {"1000/keyword/p50_ms": value} view used for comparisons
+def flatten(stats, prefix, flat):
+    for key, value in stats.items():
+        if isinstance(value, dict):
+            flatten(value, f"{prefix}/{key}", flat)
+        elif key.endswith(("_ms", "_s", "_mb")) and isinstance(value, (int, float)):
+            flat[f"{prefix}/{key}"] = value
+    return flat
+
+def compare(old, new, threshold=0.10):
+    old_flat, new_flat = {}, {}
+    for run in old["runs"]:
+        flatten(run, str(run["passages"]), old_flat)
+    for run in new["runs"]:
+        flatten(run, str(run["passages"]), new_flat)
+
+    print(f"\n📊 Compared with {old['meta'].get('commit')} (changes over {threshold:.0%}):")
+    for key in sorted(new_flat.keys() & old_flat.keys()):
+        before, after = old_flat[key], new_flat[key]
+        if before and abs(after - before) / before > threshold:
+            marker = "🔺" if after > before else "🔻"
+            print(f"  {marker} {key}: {before:.3f} → {after:.3f} ({(after - before) / before:+.0%})")
+
+# --------------------------
+# 5. Run
+# --------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark keyword, semantic and end-to-end chat paths")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated passage counts, up to 1000000")
+    parser.add_argument("--queries", type=int, default=QUERIES_PER_SIZE)
+    parser.add_argument("--model", default="hash", help="'hash' or a sentence-transformers model name")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--store-dtype", choices=("float32", "float16", "int8"), default=EMBED_STORE_DTYPE)
+    parser.add_argument("--ann", choices=("none", "ivf", "hnsw"), default=ANN_INDEX)
+    parser.add_argument("--turns", type=int, default=E2E_TURNS, help="end-to-end chat turns per size (0 to skip)")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--token-delay", type=float, default=0.005)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--compare", help="earlier results JSON to diff against")
+    args = parser.parse_args()
+    try:
+        check_index_settings(args.store_dtype, args.ann)
+    except ValueError as exc:
+        parser.error(str(exc))
+
+    model = load_model(args.model)
+    results = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "args": vars(args),
+        },
+        "runs": [],
+    }
+
+    try:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            print(f"🧪 {size} passages ({args.store_dtype}, ANN {args.ann})...")
+            corpus = Corpus(size, args.seed)
+            with tempfile.TemporaryDirectory(prefix="benchmark-docs-") as folder:
+                write_corpus(corpus, folder)
+                retriever, timings = build_cold_and_warm(folder, model, args.store_dtype, args.ann)
+                run = bench_retrieval(corpus, model, retriever, args.queries)
+                run["build"] = timings
+                if size <= MEMORY_MAX_PASSAGES:
+                    run["memory"] = measure_memory(folder, model, args.store_dtype, args.ann)
+                if args.turns:
+                    run["end_to_end"] = bench_end_to_end(corpus, retriever, args.turns, args.llm_latency,
+                                                         args.token_delay)
+            results["runs"].append(run)
+            cold, warm = timings["cold"], timings["warm"]
+            print(f"   build cold {cold['total_s']:.2f}s ({cold['encoded']} encoded), warm {warm['total_s']:.2f}s "
+                  f"({warm['encoded']} encoded) | keyword p50 {run['keyword']['p50_ms']:.2f}ms | "
+                  f"semantic p50 {run['semantic']['p50_ms']:.2f}ms | hybrid p50 {run['hybrid']['p50_ms']:.2f}ms")
+            del corpus, retriever
+            gc.collect()
+    finally:
+        clear_caches()
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            compare(json.load(f), results)
@@ -0,0 +1,141 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from llm_gateway import chat
+from metrics import timed
+
+# --------------------------
+# 1. Settings
+# --------------------------
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "3000"))
+# Share of the budget left after the system prompt and question that passages
+# may use; whatever they leave unused goes to history.
+CONTEXT_SHARE = 0.6
+# Older turns are folded into the rolling summary once recent history exceeds this
+HISTORY_COMPACT_AT = int(os.getenv("HISTORY_COMPACT_AT", "1200"))
+# Messages kept verbatim after compaction: two question/answer pairs (keep it even)
+KEEP_RECENT_MESSAGES = 4
+
+SUMMARY_PROMPT = (
+    "Summarize this support conversation in under 120 words for the assistant's own memory. "
+    "Keep product names, settings, error messages and anything the user still needs. "
+)
+
+# --------------------------
+# 2. Token counting
+# --------------------------
+try:
+    import tiktoken
+    encoding = tiktoken.get_encoding("cl100k_base")
+
+    def count_tokens(text):
+        return len(encoding.encode(text, disallowed_special=()))
+except ImportError:
+    # ~4 characters per token for English text
+    def count_tokens(text):
+        return (len(text) + 3) // 4
+
+def message_tokens(message):
+    return count_tokens(message["content"]) + 4
+
+def truncate_to_tokens(text, budget):
+    if count_tokens(text) <= budget:
+        return text
+    cut = max(0, budget * 4)
+    while cut and count_tokens(text[:cut]) > budget:
+        cut = int(cut * 0.9)
+    return text[:cut].rsplit(" ", 1)[0] + " ..."
+
+# --------------------------
+# 3. Conversation with rolling summary
+# --------------------------
+# Compaction runs on a small shared pool, never on the request path: until it
+# finishes, history_messages simply drops the oldest turns that do not fit.
+summary_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="history-summary")
+
+class Conversation:
+    def __init__(self, compact_at=HISTORY_COMPACT_AT, keep_recent=KEEP_RECENT_MESSAGES):
+        self.compact_at = compact_at
+        self.keep_recent = keep_recent
+        self.summary = ""
+        self.turns = []
+        self.lock = threading.Lock()
+        self.compacting = False
+
+    def add_turn(self, query, answer):
+        with self.lock:
+            self.turns.append({"role": "user", "content": query})
+            self.turns.append({"role": "assistant", "content": answer})
+            over = sum(message_tokens(m) for m in self.turns) > self.compact_at
+            if over and not self.compacting and len(self.turns) > self.keep_recent:
+                self.compacting = True
+                old = self.turns[:len(self.turns) - self.keep_recent]
+                summary_pool.submit(self.compact, old, self.summary)
+
+    def compact(self, old, previous_summary):
+        try:
+            transcript = "\n".join(f"{m['role']}: {m['content']}" for m in old)
+            if previous_summary:
+                transcript = f"Earlier summary: {previous_summary}\n{transcript}"
+            with timed("history_summary"):
+                summary = chat([
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": transcript},
+                ])
+            with self.lock:
+                self.summary = summary
+                # Only appends happen meanwhile, so the summarized turns are still first
+                del self.turns[:len(old)]
+        except Exception as exc:
+            print(f"⚠️ History compaction failed: {exc}")
+        finally:
+            self.compacting = False
+
+    # Rolling summary plus the newest question/answer pairs that fit in budget
+    # tokens; a pair is kept or dropped whole, so the model never sees an
+    # answer without the question it answered
+    def history_messages(self, budget):
+        with self.lock:
+            summary, turns = self.summary, list(self.turns)
+        messages = []
+        if summary:
+            summary_message = {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+            if message_tokens(summary_message) <= budget:
+                messages.append(summary_message)
+                budget -= message_tokens(summary_message)
+        start = len(turns)
+        while start >= 2:
+            cost = message_tokens(turns[start - 2]) + message_tokens(turns[start - 1])
+            if cost > budget:
+                break
+            start -= 2
+            budget -= cost
+        return messages + turns[start:]
+
+# --------------------------
+# 4. Budgeted prompt assembly
+# --------------------------
+# matches are (doc_name, passage_text) pairs in rank order
+def build_context(matches, budget):
+    parts = []
+    for name, text in matches:
+        block = f"{name}:\n{text}"
+        cost = count_tokens(block) + 2
+        if cost > budget:
+            if budget > 50:
+                parts.append(truncate_to_tokens(block, budget - 2))
+            break
+        parts.append(block)
+        budget -= cost
+    return "\n---\n".join(parts)
+
+def build_messages(system_prompt, query, matches, conversation=None, budget=PROMPT_TOKEN_BUDGET):
+    with timed("context_assembly"):
+        system = {"role": "system", "content": system_prompt}
+        remaining = budget - message_tokens(system) - count_tokens(query) - 20
+
+        context = build_context(matches, int(remaining * CONTEXT_SHARE))
+        remaining -= count_tokens(context)
+        history = conversation.history_messages(remaining) if conversation else []
+
+        return [system] + history + [{"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{query}"}]
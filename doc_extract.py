@@ -0,0 +1,101 @@
+import os
+import re
+import zipfile
+import unicodedata
+from html.parser import HTMLParser
+from xml.etree import ElementTree
+
+# --------------------------
+# 1. Text extraction
+# --------------------------
+# What doc_ingest's worker processes import: standard library only and no
+# import-time side effects, so a spawned worker starts fast and never
+# touches numpy, the caches or the metrics server.
+class HTMLText(HTMLParser):
+    SKIP = {"script", "style", "noscript", "head"}
+    BLOCKS = {"p", "div", "br", "li", "tr", "section", "article", "h1", "h2", "h3", "h4", "h5", "h6", "pre", "table"}
+
+    def __init__(self):
+        super().__init__()
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP:
+            self.skipping += 1
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in self.BLOCKS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+def html_text(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        parser = HTMLText()
+        parser.feed(f.read())
+        parser.close()
+    return "".join(parser.parts)
+
+# DOCX is zipped XML: paragraphs are w:p elements holding w:t runs
+WORD_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+def docx_text(path):
+    with zipfile.ZipFile(path) as archive:
+        root = ElementTree.fromstring(archive.read("word/document.xml"))
+    paragraphs = []
+    for paragraph in root.iter(f"{WORD_NS}p"):
+        parts = []
+        for node in paragraph.iter():
+            if node.tag == f"{WORD_NS}t":
+                parts.append(node.text or "")
+            elif node.tag == f"{WORD_NS}tab":
+                parts.append("\t")
+            elif node.tag in (f"{WORD_NS}br", f"{WORD_NS}cr"):
+                parts.append("\n")
+        paragraphs.append("".join(parts))
+    return "\n".join(paragraphs)
+
+# pypdf is only imported by workers that actually meet a PDF
+def pdf_text(path):
+    from pypdf import PdfReader
+    return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+
+def plain_text(path):
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+EXTRACTORS = {".html": html_text, ".htm": html_text, ".docx": docx_text, ".pdf": pdf_text}
+
+# Same text for the same content whatever the format it was extracted from:
+# Unicode NFKC, one space between words, at most one blank line between
+# paragraphs
+def normalize_text(text):
+    text = unicodedata.normalize("NFKC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = re.sub(r"[^\S\n]+", " ", text)
+    text = re.sub(r" *\n *", "\n", text)
+    text = re.sub(r"\n{3,}", "\n\n", text)
+    return text.strip()
+
+# .txt and .md are returned exactly as written, so their passages and
+# embedding cache keys stay what they were before other formats existed
+def read_doc(folder, name):
+    extractor = EXTRACTORS.get(os.path.splitext(name)[1].lower())
+    if extractor is None:
+        return plain_text(os.path.join(folder, name))
+    return normalize_text(extractor(os.path.join(folder, name)))
+
+# Runs in a worker process; errors come back as values so one bad file
+# does not abort the whole ingest
+def extract(job):
+    folder, name = job
+    try:
+        return name, read_doc(folder, name), None
+    except Exception as exc:
+        return name, None, f"{type(exc).__name__}: {exc}"
@@ -0,0 +1,229 @@
+import os
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+import numpy as np
+from doc_extract import extract
+from retrieval import (
+    ANN_INDEX, DOCS_FOLDER, EMBED_STORE_DTYPE, ENCODE_CHUNK, DocIndex, build_passage_index, check_index_settings,
+    encode_passages, split_passages,
+)
+
+# --------------------------
+# 1. Settings
+# --------------------------
+DOC_EXTENSIONS = (".txt", ".md", ".html", ".htm", ".docx", ".pdf")
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", str(min(8, os.cpu_count() or 1))))
+# Small plain-text folders are read in-process; a pool only pays for itself
+# with many files or with PDF/DOCX parsing
+PARALLEL_MIN_FILES = 32
+HEAVY_EXTENSIONS = (".docx", ".pdf")
+
+# --------------------------
+# 2. Discovery
+# --------------------------
+# Doc names are paths relative to the folder with "/" separators, so files
+# directly in docs/ keep the plain file names they always had.
+def discover_docs(folder=DOCS_FOLDER):
+    names = []
+    for root, dirs, files in os.walk(folder):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for file_name in files:
+            if file_name.lower().endswith(DOC_EXTENSIONS) and not file_name.startswith("."):
+                names.append(os.path.relpath(os.path.join(root, file_name), folder).replace(os.sep, "/"))
+    return sorted(names)
+
+# --------------------------
+# 3. Streaming pipeline
+# --------------------------
+class IngestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+        self.files = 0
+        self.failed = 0
+        self.chars = 0
+        self.passages = 0
+        self.encoded = 0
+
+    def finish(self):
+        self.seconds = time.perf_counter() - self.started
+        return self
+
+    def report(self):
+        elapsed = max(self.seconds, 1e-9)
+        line = f"📥 {self.files} file(s) read in {self.seconds:.2f}s ({self.files / elapsed:.1f} files/s"
+        if self.passages:
+            line += f", {self.passages} passages at {self.passages / elapsed:.1f} passages/s, {self.encoded} encoded"
+        line += ")"
+        if self.failed:
+            line += f", {self.failed} skipped"
+        return line
+
+# Yields (name, text) in name order as workers finish them, so callers can
+# index documents while later ones are still being extracted
+def iter_docs(folder=DOCS_FOLDER, workers=INGEST_WORKERS, stats=None):
+    names = discover_docs(folder)
+    jobs = [(folder, name) for name in names]
+    parallel = workers > 1 and (
+        len(names) >= PARALLEL_MIN_FILES or any(n.lower().endswith(HEAVY_EXTENSIONS) for n in names)
+    )
+    if parallel:
+        # Spawned, not forked: callers already run threads (model warm-up,
+        # docs watcher, servers) and a fork would copy their locks mid-use.
+        # Workers only need doc_extract; they still re-import the launching
+        # script, so no module may do real work at import time.
+        pool = ProcessPoolExecutor(max_workers=min(workers, len(jobs)),
+                                   mp_context=multiprocessing.get_context("spawn"))
+        results = pool.map(extract, jobs, chunksize=max(1, min(32, len(jobs) // (workers * 4))))
+    else:
+        pool, results = None, map(extract, jobs)
+    try:
+        for name, text, error in results:
+            if error:
+                if stats:
+                    stats.failed += 1
+                print(f"⚠️ Skipped {name}: {error}")
+                continue
+            if stats:
+                stats.files += 1
+                stats.chars += len(text)
+            yield name, text
+    finally:
+        if pool:
+            pool.shutdown(cancel_futures=True)
+
+# {name: text} for every supported file under folder, without encoding: for
+# keyword-only callers and the Streamlit app, whose keyword search is up
+# before the model is. Everything that embeds at startup goes through ingest().
+def load_docs(folder=DOCS_FOLDER, workers=INGEST_WORKERS, stats=None):
+    docs = dict(iter_docs(folder, workers, stats))
+    if stats:
+        stats.finish()
+    return docs
+
+# Extraction, chunking and encoding overlap: passages are encoded (through the
+# embedding cache) chunk passages at a time while workers keep extracting,
+# and vectors go straight into the index matrix instead of being collected.
+# model may be a Future that is still loading; extraction starts without it.
+# A float16/int8 store is published once every doc is read, since its
+# version covers all passages. Returns (docs, index, stats).
+def ingest(model, folder=DOCS_FOLDER, workers=INGEST_WORKERS, chunk=ENCODE_CHUNK,
+           store_dtype=EMBED_STORE_DTYPE, ann=ANN_INDEX):
+    check_index_settings(store_dtype, ann)
+    stats = IngestStats()
+    docs, passages, pending = {}, [], []
+    matrix = None
+    for name, text in iter_docs(folder, workers, stats):
+        docs[name] = text
+        if store_dtype != "float32":
+            continue
+        pending.extend(split_passages(name, text))
+        if len(pending) >= chunk:
+            model = resolve(model)
+            matrix = append_encoded(model, folder, matrix, passages, pending, stats)
+    model = resolve(model)
+
+    if store_dtype != "float32":
+        index, stats.encoded = build_passage_index(model, docs, folder, store_dtype, ann)
+    else:
+        matrix = append_encoded(model, folder, matrix, passages, pending, stats)
+        index = DocIndex(passages, matrix[:len(passages)])
+        if ann != "none":
+            from ann_index import build_ann_index
+            index = build_ann_index(index, ann)
+    stats.passages = len(index)
+    return docs, index, stats.finish()
+
+def resolve(model):
+    return model.result() if isinstance(model, Future) else model
+
+# Encodes pending into the rows after passages, doubling matrix when full
+def append_encoded(model, folder, matrix, passages, pending, stats):
+    start, end = len(passages), len(passages) + len(pending)
+    rows = 0 if matrix is None else len(matrix)
+    if matrix is None or end > rows:
+        grown = np.empty((max(end, 2 * rows), model.get_sentence_embedding_dimension()), dtype=np.float32)
+        if matrix is not None:
+            grown[:start] = matrix[:start]
+        matrix = grown
+    _, encoded = encode_passages(model, pending, folder, out=matrix[start:end])
+    stats.encoded += encoded
+    passages.extend(pending)
+    pending.clear()
+    return matrix
+
+# --------------------------
+# 4. Spawned worker check
+# --------------------------
+# Extracts a scratch folder (with a .docx, so the pool is used) in spawned
+# workers while this process holds METRICS_PORT, the setup in which workers
+# that bound ports or did other work on import used to crash the ingest.
+# Returns a list of problems, empty when the check passes.
+def check_spawn_ingest(workers=2):
+    import zipfile
+    import tempfile
+    import metrics
+    server = metrics.serve_metrics(port=0)
+    previous = os.environ.get("METRICS_PORT")
+    os.environ["METRICS_PORT"] = str(server.server_address[1])
+    try:
+        with tempfile.TemporaryDirectory(prefix="ingest-spawn-check-") as folder:
+            for i in range(3):
+                with open(os.path.join(folder, f"guide{i}.txt"), "w", encoding="utf-8") as f:
+                    f.write(f"Guide {i}: how to reset a password.\n")
+            with zipfile.ZipFile(os.path.join(folder, "notes.docx"), "w") as archive:
+                archive.writestr("word/document.xml", (
+                    '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                    "<w:body><w:p><w:r><w:t>Spawned worker text</w:t></w:r></w:p></w:body></w:document>"
+                ))
+            stats = IngestStats()
+            try:
+                docs = load_docs(folder, workers, stats)
+            except Exception as exc:
+                return [f"spawned ingest failed: {type(exc).__name__}: {exc}"]
+            errors = []
+            if stats.failed or len(docs) != 4:
+                errors.append(f"expected 4 documents, got {len(docs)} ({stats.failed} skipped)")
+            if docs.get("notes.docx") != "Spawned worker text":
+                errors.append(f"notes.docx extracted as {docs.get('notes.docx')!r}")
+            return errors
+    finally:
+        if previous is None:
+            os.environ.pop("METRICS_PORT", None)
+        else:
+            os.environ["METRICS_PORT"] = previous
+
+# --------------------------
+# 5. Command line ingest
+# --------------------------
+# Extracts, chunks and encodes a folder once, leaving every passage vector in
+# the embedding cache so the apps start without encoding anything
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest a docs folder (txt, md, html, docx, pdf)")
+    parser.add_argument("folder", nargs="?", default=DOCS_FOLDER)
+    parser.add_argument("--workers", type=int, default=INGEST_WORKERS)
+    parser.add_argument("--extract-only", action="store_true", help="read and normalize files without encoding")
+    parser.add_argument("--check-spawn", action="store_true",
+                        help="check that spawned extraction workers run cleanly with METRICS_PORT set")
+    args = parser.parse_args()
+
+    if args.check_spawn:
+        errors = check_spawn_ingest(max(2, args.workers))
+        for error in errors:
+            print(f"❌ {error}")
+        if errors:
+            raise SystemExit(1)
+        print("✅ Spawned extraction workers ran cleanly with METRICS_PORT set.")
+    elif args.extract_only:
+        stats = IngestStats()
+        docs = load_docs(args.folder, args.workers, stats)
+        print(f"✅ Extracted {len(docs)} document(s), {stats.chars} characters.")
+        print(stats.report())
+    else:
+        from startup import in_background, load_embedding_model
+        model_future = in_background("embedding-warmup", load_embedding_model)
+        docs, index, stats = ingest(model_future, args.folder, args.workers)
+        print(f"✅ Indexed {len(docs)} document(s) into {len(index)} passages.")
+        print(stats.report())
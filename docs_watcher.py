@@ -0,0 +1,228 @@
+import os
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import threading
+from collections import namedtuple
+from keyword_index import KeywordIndex
+from vector_store import build_store_index, prune_superseded
+from llm_cache import docs_fingerprint
+from doc_extract import read_doc
+from doc_ingest import discover_docs, load_docs
+from retrieval import (
+    DOCS_FOLDER, HybridRetriever, build_passage_index, normalize, search_vectors, update_passage_index,
+)
+
+# --------------------------
+# 1. Settings
+# --------------------------
+DOCS_POLL_SECONDS = float(os.getenv("DOCS_POLL_SECONDS", "2"))
+# A file modified more recently than this is probably still being written
+DOCS_SETTLE_SECONDS = 0.5
+
+# --------------------------
+# 2. Live index with atomic swaps
+# --------------------------
+# Readers take `live.snapshot` once per question and use only that; a reload
+# builds a complete new snapshot off to the side and replaces the attribute in
+# one assignment, so in-flight questions never wait and never see a mix of
+# old and new docs. Reloads themselves are serialized by build_lock.
+Snapshot = namedtuple("Snapshot", ["docs", "keyword_index", "retriever", "version"])
+
+class LiveIndex:
+    def __init__(self, docs, docs_folder=DOCS_FOLDER):
+        self.docs_folder = docs_folder
+        self.snapshot = Snapshot(docs, KeywordIndex(docs), None, docs_fingerprint(docs))
+        self.build_lock = threading.Lock()
+        self.listeners = []
+        self.reloads = 0
+
+    # Called once the embedding model is ready; until then only keyword search
+    # exists. index is passed when doc_ingest.ingest() already built it.
+    def attach_model(self, model, index=None):
+        encoded = 0
+        with self.build_lock:
+            snap = self.snapshot
+            if index is None:
+                index, encoded = build_passage_index(model, snap.docs, self.docs_folder)
+            self.snapshot = snap._replace(retriever=HybridRetriever(model, index))
+        return encoded
+
+    def apply(self, changed, removed):
+        with self.build_lock:
+            snap = self.snapshot
+            docs = {name: text for name, text in snap.docs.items() if name not in removed}
+            docs.update(changed)
+            retriever, encoded = snap.retriever, 0
+            if retriever is not None:
+                index, encoded = update_passage_index(
+                    retriever.model, retriever.index, docs, changed, removed, self.docs_folder
+                )
+                retriever = HybridRetriever(retriever.model, index)
+            self.snapshot = Snapshot(docs, KeywordIndex(docs), retriever, docs_fingerprint(docs))
+            self.reloads += 1
+            # Every reload of a float16/int8 store publishes a full new version
+            live_store = getattr(retriever.index, "path", None) if retriever else None
+            if live_store:
+                prune_superseded(live_store, getattr(snap.retriever.index, "path", None))
+        for listener in self.listeners:
+            listener(self.snapshot)
+        return encoded
+
+# --------------------------
+# 3. Polling watcher
+# --------------------------
+# Polls mtimes and sizes (portable, no inotify dependency) and confirms edits
+# by content hash, so a touched-but-unchanged file triggers nothing. Covers
+# the same files as doc_ingest.load_docs, subfolders and all formats.
+def scan_docs(folder):
+    stats = {}
+    for name in discover_docs(folder):
+        try:
+            st = os.stat(os.path.join(folder, name))
+        except FileNotFoundError:
+            continue
+        stats[name] = (st.st_mtime_ns, st.st_size)
+    return stats
+
+def text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+class DocsWatcher:
+    def __init__(self, live, folder=DOCS_FOLDER, interval=DOCS_POLL_SECONDS):
+        self.live = live
+        self.folder = folder
+        self.interval = interval
+        self.seen = scan_docs(folder)
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="docs-watcher", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+    def poll(self):
+        current = scan_docs(self.folder)
+        now = time.time_ns()
+        docs = self.live.snapshot.docs
+        changed = {}
+        for name, (mtime, size) in current.items():
+            if self.seen.get(name) == (mtime, size):
+                continue
+            if now - mtime < DOCS_SETTLE_SECONDS * 1e9:
+                current[name] = self.seen.get(name)
+                continue
+            try:
+                text = read_doc(self.folder, name)
+            except Exception as exc:
+                # Retried once the file changes again; the previous text stays live
+                print(f"⚠️ Could not read {name}: {exc}")
+                continue
+            if name not in docs or text_hash(text) != text_hash(docs[name]):
+                changed[name] = text
+        removed = {name for name in docs if name not in current}
+        self.seen = {name: stat for name, stat in current.items() if stat is not None}
+        if changed or removed:
+            started = time.perf_counter()
+            encoded = self.live.apply(changed, removed)
+            print(f"🔄 Docs reloaded: {len(changed)} added/changed, {len(removed)} removed, "
+                  f"{encoded} passage(s) re-encoded in {time.perf_counter() - started:.2f}s")
+        return changed, removed
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.poll()
+            except Exception as exc:
+                print(f"⚠️ Docs reload failed: {exc}")
+
+# --------------------------
+# 4. Reload check
+# --------------------------
+# Edits a doc in a scratch copy of the folder while a reader thread keeps
+# searching the previous snapshot, which must return the same hits before,
+# during and after the swap. With a float16/int8 store this is the case where
+# a rebuild must not touch files the live snapshot has mapped (a violation
+# kills the process with SIGBUS rather than failing the check); a second edit
+# then checks that only the live and previous store versions are kept.
+def check_reload(model, folder=DOCS_FOLDER, store_dtype="int8", top_k=3):
+    with tempfile.TemporaryDirectory(prefix="docs-reload-check-") as scratch:
+        work = os.path.join(scratch, "docs")
+        store_dir = os.path.join(scratch, "store")
+        shutil.copytree(folder, work)
+        live = LiveIndex(load_docs(work), work)
+        if store_dtype == "float32":
+            index, _ = build_passage_index(model, live.snapshot.docs, work, store_dtype)
+        else:
+            index, _ = build_store_index(model, live.snapshot.docs, work, store_dtype, store_dir)
+        live.snapshot = live.snapshot._replace(retriever=HybridRetriever(model, index))
+        old = live.snapshot
+
+        queries = [" ".join(p.text.split()[:8]) for p in index.passages[:20]]
+        vectors = normalize(model.encode(queries, convert_to_numpy=True))
+        expected = search_vectors(old.retriever.index, vectors, top_k)
+        errors = []
+        stop = threading.Event()
+
+        def reader():
+            while not stop.is_set():
+                if search_vectors(old.retriever.index, vectors, top_k) != expected:
+                    errors.append("the old snapshot's results changed during the reload")
+                    return
+
+        def edit(name, marker):
+            path = os.path.join(work, name)
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(f"\n\n{marker}: this paragraph was added while the old snapshot was being searched.\n")
+            settled = time.time() - 2 * DOCS_SETTLE_SECONDS
+            os.utime(path, (settled, settled))
+
+        def versions():
+            parent = os.path.join(store_dir, store_dtype)
+            return {os.path.join(parent, v) for v in os.listdir(parent) if not v.startswith(".")}
+
+        watcher = DocsWatcher(live, work)
+        thread = threading.Thread(target=reader, daemon=True)
+        thread.start()
+        name = next(n for n in old.docs if n.endswith((".txt", ".md")))
+        edit(name, "Reload check")
+        watcher.poll()
+        stop.set()
+        thread.join()
+
+        new = live.snapshot
+        if new is old or "Reload check" not in new.docs[name]:
+            errors.append(f"the edit to {name} was not picked up")
+        elif not any("Reload check" in p.text for p in new.retriever.index.passages):
+            errors.append("the new snapshot's index is missing the edited passage")
+        if search_vectors(old.retriever.index, vectors, top_k) != expected:
+            errors.append("the old snapshot's results changed after the reload")
+
+        if store_dtype != "float32":
+            if versions() != {index.path, new.retriever.index.path}:
+                errors.append(f"after one reload the store holds {len(versions())} version(s), expected 2")
+            edit(name, "Second reload check")
+            watcher.poll()
+            latest = live.snapshot.retriever.index.path
+            if versions() != {new.retriever.index.path, latest}:
+                errors.append("after a second reload the superseded store version was not pruned")
+        return errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check that a docs reload leaves the live snapshot intact")
+    parser.add_argument("--docs", default=DOCS_FOLDER)
+    parser.add_argument("--store-dtype", choices=("float32", "float16", "int8"), default="int8")
+    args = parser.parse_args()
+
+    from startup import load_embedding_model
+    errors = check_reload(load_embedding_model(), args.docs, args.store_dtype)
+    for error in errors:
+        print(f"❌ {error}")
+    if errors:
+        raise SystemExit(1)
+    print(f"✅ Reload with a live {args.store_dtype} snapshot left it intact.")
@@ -1,38 +1,22 @@
-import os
-import datetime
-from groq import Groq
+import argparse
+import time
+from llm_cache import ResponseCache, docs_fingerprint
+from llm_gateway import default_model, echo_stream, print_session_stats, stream_chat
+from keyword_index import KeywordIndex, snippet
+from interaction_log import log_interaction
+from doc_ingest import IngestStats, ingest, load_docs
+from startup import in_background, load_embedding_model, startup
 
 # --------------------------
 # 1. Load documentation
 # --------------------------
+# Subfolders included; supported file types are doc_ingest.DOC_EXTENSIONS
 DOCS_FOLDER = "docs"
 
-def load_docs():
-    docs = {}
-    for file_name in os.listdir(DOCS_FOLDER):
-        if file_name.endswith(".txt"):
-            with open(os.path.join(DOCS_FOLDER, file_name), "r", encoding="utf-8") as f:
-                docs[file_name] = f.read()
-    return docs
-
-# --------------------------
-# 2. Simple keyword search
-# --------------------------
-def search_docs(query, docs):
-    results = []
-    for name, content in docs.items():
-        if query.lower() in content.lower():
-            snippet_start = content.lower().find(query.lower())
-            snippet = content[max(0, snippet_start-80):snippet_start+500]
-            results.append((name, snippet))
-    return results
-
 # --------------------------
-# 3. Ask Groq AI using context
+# 2. Ask the AI using context
 # --------------------------
-def ask_ai(query, context):
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
+def ask_ai(query, context, cache=None):
     prompt = f"""
     You are an Effivity support assistant.
     Use the provided documentation context to answer the user's question clearly and concisely.
@@ -46,42 +30,63 @@ def ask_ai(query, context):
     If the context doesn't have the answer, say 'The documentation does not cover this topic.'
     """
 
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
+    return stream_chat([{"role": "user", "content": prompt}], cache=cache)
 
 # --------------------------
-# 4. Main interaction with logging
+# 3. Main interaction with logging
 # --------------------------
 if __name__ == "__main__":
-    docs = load_docs()
-    print(f"✅ Loaded {len(docs)} documents.\n")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=("keyword", "semantic", "hybrid"), default="keyword")
+    args = parser.parse_args()
+
+    # The embedding model is only loaded when a dense mode is requested, on a
+    # background thread while the docs are read
+    if args.mode == "keyword":
+        ingest_stats = IngestStats()
+        with startup.phase("read docs"):
+            docs = load_docs(DOCS_FOLDER, stats=ingest_stats)
+    else:
+        from retrieval import HybridRetriever
+
+        model_future = in_background("embedding-warmup", load_embedding_model)
+        with startup.phase("ingest docs"):
+            docs, doc_index, ingest_stats = ingest(model_future, DOCS_FOLDER)
+        retriever = HybridRetriever(model_future.result(), doc_index)
+    print(ingest_stats.report())
+    cache = ResponseCache(docs_version=docs_fingerprint(docs))
+    index = KeywordIndex(docs)
+    print(f"✅ Loaded and indexed {len(docs)} documents ({len(index.postings)} terms).\n")
+    if args.mode != "keyword":
+        print(f"🧠 Passage embeddings ready ({args.mode} search).\n")
+    print(f"🚀 Startup breakdown:\n{startup.report()}\n")
 
     while True:
         query = input("💬 Ask Effivity AI (or 'exit' to quit): ")
         if query.lower() == "exit":
+            print_session_stats(cache)
             break
 
-        matches = search_docs(query, docs)
+        started = time.perf_counter()
+        if args.mode == "keyword":
+            hits = index.search(query, top_k=2)
+            matches = [(n, snippet(index, n, offset, snippet_chars=500)) for n, _, offset in hits]
+            scores = [(n, score) for n, score, _ in hits]
+        else:
+            hits = retriever.search(query, args.mode)
+            matches = [(p.doc, p.text) for p, _ in hits]
+            scores = [(p.doc, score) for p, score in hits]
         if not matches:
             print("⚠️ No relevant info found in docs.\n")
             continue
+        retrieved = time.perf_counter() - started
 
-        combined_context = "\n---\n".join([f"{n}:\n{s}" for n, s in matches[:2]])
-        answer = ask_ai(query, combined_context)
-
-        print(f"\n🤖 AI Answer:\n{answer}\n{'-'*80}\n")
-
-        # Log interaction
-        log_entry = (
-            f"\n[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]\n"
-            f"Q: {query}\n"
-            f"Context used: {', '.join([n for n, _ in matches[:2]])}\n"
-            f"A: {answer}\n"
-            f"{'-'*80}\n"
-        )
+        combined_context = "\n---\n".join([f"{n}:\n{s}" for n, s in matches])
+        print("\n🤖 AI Answer:")
+        answer, first_token = echo_stream(ask_ai(query, combined_context, cache), started)
+        total = time.perf_counter() - started
+        print(f"\n⏱️ First token after {first_token:.2f}s, total {total:.2f}s\n{'-'*80}\n")
 
-        with open("ai_history.log", "a", encoding="utf-8") as f:
-            f.write(log_entry)
+        # Queued for the background interaction logger
+        timings = {"retrieve": retrieved, "first_token": first_token, "total": total}
+        log_interaction(query, scores, answer, default_model(), timings, mode=args.mode)
@@ -0,0 +1,77 @@
+import os
+import hashlib
+import sqlite3
+import numpy as np
+
+# --------------------------
+# 1. Settings
+# --------------------------
+EMBED_CACHE_PATH = os.getenv("EMBED_CACHE_PATH", "embeddings_cache.db")
+# Texts per model.encode() call; larger batches keep the model busy
+ENCODE_BATCH = int(os.getenv("EMBED_ENCODE_BATCH", "128"))
+# Keeps "doc_key IN (...)" under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+# --------------------------
+# 2. Cache storage
+# --------------------------
+def content_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def open_cache(path=EMBED_CACHE_PATH):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS embeddings (
+        doc_key TEXT,
+        model_name TEXT,
+        content_hash TEXT,
+        dim INTEGER,
+        vector BLOB,
+        PRIMARY KEY (doc_key, model_name)
+    );
+    """)
+    return conn
+
+# --------------------------
+# 3. Encode only new or edited texts
+# --------------------------
+# texts is {key: text}, where key is the file path (or path#passage).
+# A stored vector is reused only if key, model and content hash all match.
+# Only the requested keys are read, so callers can go chunk by chunk.
+def cached_encode(model, model_name, texts, cache_path=EMBED_CACHE_PATH, batch_size=ENCODE_BATCH):
+    conn = open_cache(cache_path)
+    keys = list(texts)
+    stored = {}
+    for start in range(0, len(keys), LOOKUP_CHUNK):
+        part = keys[start:start + LOOKUP_CHUNK]
+        stored.update(
+            (key, (h, dim, blob))
+            for key, h, dim, blob in conn.execute(
+                f"SELECT doc_key, content_hash, dim, vector FROM embeddings "
+                f"WHERE model_name = ? AND doc_key IN ({', '.join('?' * len(part))})",
+                [model_name] + part,
+            )
+        )
+
+    embeddings = {}
+    missing = []
+    for key, text in texts.items():
+        h = content_hash(text)
+        hit = stored.get(key)
+        if hit and hit[0] == h:
+            embeddings[key] = np.frombuffer(hit[2], dtype=np.float32, count=hit[1])
+        else:
+            missing.append((key, h, text))
+
+    if missing:
+        vectors = model.encode([text for _, _, text in missing], batch_size=batch_size, convert_to_numpy=True)
+        rows = []
+        for (key, h, _), vec in zip(missing, vectors):
+            vec = np.asarray(vec, dtype=np.float32)
+            embeddings[key] = vec
+            rows.append((key, model_name, h, vec.shape[0], vec.tobytes()))
+        conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+        conn.commit()
+
+    conn.close()
+    return embeddings, len(missing)
@@ -0,0 +1,98 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+import metrics
+
+# --------------------------
+# 1. Settings
+# --------------------------
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_MAX_WAIT_MS = float(os.getenv("EMBED_MAX_WAIT_MS", "5"))
+EMBED_WORKERS = int(os.getenv("EMBED_WORKERS", "1"))
+
+# --------------------------
+# 2. Micro-batching encoder
+# --------------------------
+# Wraps a SentenceTransformer so single-query encode() calls from many
+# sessions are coalesced into one batched forward pass on worker threads.
+# A worker takes everything already queued; it only waits up to max_wait for
+# more while its previous batch had company, so a lone user never pays the
+# wait. List inputs (index builds) are already batched and go straight through.
+class BatchingEncoder:
+    def __init__(self, model, max_batch=EMBED_MAX_BATCH, max_wait_ms=EMBED_MAX_WAIT_MS, workers=EMBED_WORKERS):
+        self.model = model
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self.lock = threading.Lock()
+        self.threads = [
+            threading.Thread(target=self.run, name=f"embed-batcher-{i}", daemon=True) for i in range(workers)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def get_sentence_embedding_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def submit(self, text):
+        future = Future()
+        self.queue.put((text, future))
+        return future
+
+    def encode(self, sentences, convert_to_numpy=True, **kwargs):
+        if isinstance(sentences, str):
+            return self.submit(sentences).result()
+        return self.model.encode(sentences, convert_to_numpy=convert_to_numpy, **kwargs)
+
+    def collect(self, busy):
+        batch = [self.queue.get()]
+        deadline = time.perf_counter() + (self.max_wait if busy else 0.0)
+        while len(batch) < self.max_batch:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+        return batch
+
+    def run(self):
+        busy = False
+        while True:
+            batch = self.collect(busy)
+            busy = len(batch) > 1
+            batch = [(text, future) for text, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            texts = [text for text, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                with metrics.timed("embed_batch"):
+                    vectors = self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+            except Exception as exc:
+                for future in futures:
+                    future.set_exception(exc)
+                continue
+            for future, vector in zip(futures, vectors):
+                future.set_result(vector)
+            with self.lock:
+                self.batches += 1
+                self.items += len(texts)
+            metrics.count("embed_batches")
+            metrics.count("embed_queries", len(texts))
+
+    def stats(self):
+        with self.lock:
+            return {
+                "batches": self.batches,
+                "queries": self.items,
+                "avg_batch": self.items / self.batches if self.batches else 0.0,
+            }
@@ -0,0 +1,422 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import argparse
+import threading
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+from async_summarizer import REQUESTS_PER_MINUTE, SUMMARY_MODEL, TOKENS_PER_MINUTE, Progress, TokenBucket, summarize_one
+from context_builder import Conversation, build_messages
+from doc_ingest import ingest
+from docs_watcher import DocsWatcher, LiveIndex
+from embedding_service import BatchingEncoder
+from interaction_log import log_interaction
+from llm_cache import ResponseCache
+from llm_gateway import acomplete, cache_model_key, default_model
+from retrieval import DOCS_FOLDER, SEARCH_MODES, normalize
+from semantic_cache import SemanticCache
+from startup import in_background, load_embedding_model, startup
+from support_db import DB_PATH, connect
+from ticket_index import SIMILAR_TICKETS, find_duplicate, load_ticket_index, ticket_matches
+
+# --------------------------
+# 1. Settings
+# --------------------------
+# Run offline against the stub for load testing:
+#   python stub_llm_server.py --port 8765 --latency 0.5
+#   LLM_BACKEND=stub python helpdesk_api.py
+#   python api_load_test.py --concurrency 100 --requests 2000
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8000"))
+# Requests being worked on at once; up to API_MAX_QUEUE more wait for a slot
+# and anything beyond that is turned away at once with 503 + Retry-After
+API_MAX_INFLIGHT = int(os.getenv("API_MAX_INFLIGHT", "64"))
+API_MAX_QUEUE = int(os.getenv("API_MAX_QUEUE", "256"))
+# Seconds from arrival, queueing included, before a request gets 504
+API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "30"))
+# Threads for BM25/dense scoring and SQLite lookups; query encoding has its
+# own batching workers (embedding_service.py)
+API_CPU_WORKERS = int(os.getenv("API_CPU_WORKERS", "8"))
+API_MAX_BODY = 1 << 20
+# An idle keep-alive connection (or a client stalling mid-headers) is closed
+API_IDLE_TIMEOUT = 15.0
+MAX_TOP_K = 20
+ANSWER_MAX_TOKENS = 600
+
+SYSTEM_PROMPT = (
+    "You are an Effivity support assistant. "
+    "Use the provided documentation and similar past tickets to help the user clearly and accurately. "
+    "If something isn't in the context, say so honestly."
+)
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+# --------------------------
+# 2. Assistant state, loaded once
+# --------------------------
+# Docs, indexes, caches and the model are shared by every request. Docs are
+# hot-reloaded by the same watcher the Streamlit app uses; each request reads
+# one snapshot.
+class Assistant:
+    def __init__(self, docs_folder=DOCS_FOLDER, db_path=DB_PATH, cpu_workers=API_CPU_WORKERS):
+        self.db_path = db_path
+        self.pool = ThreadPoolExecutor(max_workers=cpu_workers, thread_name_prefix="api-cpu")
+        self.local = threading.local()
+
+        # Passages are encoded as soon as the model (loading in the background) is up
+        model_future = in_background("embedding-warmup", load_embedding_model)
+        with startup.phase("ingest docs"):
+            docs, doc_index, ingest_stats = ingest(model_future, docs_folder)
+        print(ingest_stats.report())
+        self.live = LiveIndex(docs, docs_folder)
+        self.response_cache = ResponseCache(docs_version=self.live.snapshot.version)
+        # Ticket summaries do not depend on the docs
+        self.summary_cache = ResponseCache()
+
+        # Concurrent requests' query encodes are coalesced into batched forward passes
+        self.model = BatchingEncoder(model_future.result())
+        self.live.attach_model(self.model, doc_index)
+        self.answer_cache = SemanticCache(self.model.get_sentence_embedding_dimension())
+        self.live.listeners.append(lambda snap: self.response_cache.set_docs_version(snap.version))
+        self.live.listeners.append(lambda snap: self.answer_cache.clear())
+        DocsWatcher(self.live, docs_folder).start()
+
+        self.tickets = None
+        try:
+            with startup.phase("ticket index"):
+                self.tickets = load_ticket_index(self.db(), self.model)
+        except sqlite3.Error as exc:
+            print(f"⚠️ Similar-ticket search unavailable: {exc}")
+
+        # Shared by all /summarize-ticket calls, so the provider limits hold
+        # however many clients summarize at once
+        self.requests = TokenBucket(REQUESTS_PER_MINUTE)
+        self.tokens = TokenBucket(TOKENS_PER_MINUTE)
+        self.progress = Progress()
+
+    # One SQLite connection per pool thread
+    def db(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = self.local.conn = connect(self.db_path)
+        return conn
+
+    async def in_pool(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.pool, fn, *args)
+
+    # Awaits the batching encoder's future directly, so no thread is parked
+    # while a query waits for its batch
+    async def encode(self, text):
+        with metrics.timed("query_encode"):
+            return normalize(await asyncio.wrap_future(self.model.submit(text)))
+
+    def similar_tickets(self, query_vector, summary_model=None):
+        if self.tickets is None:
+            return []
+        conn = self.db()
+        self.tickets.refresh(conn)
+        return self.tickets.similar(conn, query_vector, SIMILAR_TICKETS, summary_model=summary_model)
+
+    # --------------------------
+    # 3. Endpoints
+    # --------------------------
+    async def search(self, body):
+        query = required_text(body, "query")
+        mode = search_mode(body)
+        top_k = min(MAX_TOP_K, max(1, int_field(body, "top_k", 3)))
+        retriever = self.live.snapshot.retriever
+        query_vector = await self.encode(query) if mode != "keyword" else None
+        hits = await self.in_pool(retriever.search, query, mode, top_k, query_vector)
+        return {
+            "mode": mode,
+            "results": [{"doc": p.doc, "score": round(float(score), 4), "text": p.text} for p, score in hits],
+        }
+
+    # history is optional earlier turns, [{"role": "user"|"assistant", "content": ...}]
+    async def answer(self, body):
+        started = time.perf_counter()
+        query = required_text(body, "query")
+        mode = search_mode(body)
+        history = history_field(body)
+        retriever = self.live.snapshot.retriever
+
+        query_vector = await self.encode(query)
+        hits, similar = await asyncio.gather(
+            self.in_pool(retriever.search, query, mode, 3, query_vector),
+            self.in_pool(self.similar_tickets, query_vector),
+        )
+        matches = [(p.doc, p.text) for p, _ in hits] + ticket_matches(similar)
+        doc_set = frozenset(n for n, _ in matches)
+        retrieved = time.perf_counter() - started
+
+        source = "semantic_cache"
+        answer = self.answer_cache.lookup(query_vector, doc_set, query, history)
+        if answer is None:
+            conversation = Conversation()
+            conversation.turns = history
+            messages = build_messages(SYSTEM_PROMPT, query, matches, conversation)
+            key = cache_model_key()
+            source = "response_cache"
+            answer = await self.in_pool(self.response_cache.get, key, messages)
+            if answer is None:
+                source = "llm"
+                response = await acomplete(messages, max_tokens=ANSWER_MAX_TOKENS)
+                answer = response.choices[0].message.content.strip()
+                await self.in_pool(self.response_cache.put, key, messages, answer)
+            self.answer_cache.store(query_vector, doc_set, query, answer, history)
+
+        timings = {"retrieve": retrieved, "total": time.perf_counter() - started}
+        log_interaction(query, [(p.doc, score) for p, score in hits], answer, default_model(), timings,
+                        mode=mode, endpoint="/answer", source=source,
+                        similar_tickets=[(t["ticket_id"], round(float(t["score"]), 4)) for t in similar])
+        return {
+            "answer": answer,
+            "source": source,
+            "docs": [{"doc": p.doc, "score": round(float(score), 4)} for p, score in hits],
+            "similar_tickets": [ticket_brief(t) for t in similar],
+            "timings": {stage: round(seconds, 4) for stage, seconds in timings.items()},
+        }
+
+    # A near-duplicate of a summarized ticket gets that summary back without
+    # an LLM call; otherwise the summary prompt includes the closest tickets
+    async def summarize_ticket(self, body):
+        issue = required_text(body, "issue")
+        vector = await self.encode(issue)
+        similar = await self.in_pool(self.similar_tickets, vector, SUMMARY_MODEL)
+        duplicate = find_duplicate(similar)
+        if duplicate:
+            metrics.count("summaries_reused")
+            summary, reused_from = duplicate["summary"], duplicate["source_ticket_id"] or duplicate["ticket_id"]
+        else:
+            summary = await summarize_one(issue, SUMMARY_MODEL, self.requests, self.tokens, self.progress,
+                                          self.summary_cache, ticket_matches(similar))
+            reused_from = None
+        return {
+            "summary": summary,
+            "model": SUMMARY_MODEL,
+            "reused_from": reused_from,
+            "similar_tickets": [ticket_brief(t) for t in similar],
+        }
+
+    def health(self):
+        snap = self.live.snapshot
+        return {
+            "status": "ok",
+            "docs": len(snap.docs),
+            "passages": len(snap.retriever.index),
+            "tickets": len(self.tickets) if self.tickets is not None else 0,
+            "docs_version": snap.version,
+            "embedding_batches": self.model.stats(),
+        }
+
+# --------------------------
+# 4. Request validation
+# --------------------------
+def required_text(body, field):
+    value = body.get(field)
+    if not isinstance(value, str) or not value.strip():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{field}' must be a non-empty string")
+    return value.strip()
+
+def int_field(body, field, default):
+    value = body.get(field, default)
+    if not isinstance(value, int) or isinstance(value, bool):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'{field}' must be an integer")
+    return value
+
+def search_mode(body):
+    mode = body.get("mode", "hybrid")
+    if mode not in SEARCH_MODES:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"'mode' must be one of {', '.join(SEARCH_MODES)}")
+    return mode
+
+def history_field(body):
+    history = body.get("history") or []
+    if not isinstance(history, list) or not all(
+        isinstance(m, dict) and m.get("role") in ("user", "assistant") and isinstance(m.get("content"), str)
+        for m in history
+    ):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "'history' must be a list of {role: user|assistant, content} messages")
+    return [{"role": m["role"], "content": m["content"]} for m in history]
+
+def ticket_brief(ticket):
+    return {
+        "ticket_id": ticket["source_ticket_id"] or ticket["ticket_id"],
+        "score": round(float(ticket["score"]), 4),
+        "issue": ticket["issue"],
+        "resolutions": ticket["resolutions"],
+    }
+
+# --------------------------
+# 5. HTTP/1.1 on asyncio streams
+# --------------------------
+# JSON in, JSON out, with keep-alive; enough for a ticketing system or a load
+# generator to talk to without adding a web framework dependency.
+ROUTES = {
+    "/search": "search",
+    "/answer": "answer",
+    "/summarize-ticket": "summarize_ticket",
+}
+
+async def read_request(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "malformed request line")
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    if "transfer-encoding" in headers:
+        raise HTTPError(HTTPStatus.LENGTH_REQUIRED, "send the body with a Content-Length")
+    try:
+        length = int(headers.get("content-length") or 0)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "invalid Content-Length")
+    if length > API_MAX_BODY:
+        raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"body over {API_MAX_BODY} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], version, headers, body
+
+async def send_response(writer, status, payload, keep_alive, headers=None):
+    if isinstance(payload, str):
+        body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+    lines = [
+        f"HTTP/1.1 {status.value} {status.phrase}",
+        f"Content-Type: {content_type}",
+        f"Content-Length: {len(body)}",
+        f"Connection: {'keep-alive' if keep_alive else 'close'}",
+    ]
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+    await writer.drain()
+
+# Errors raised by the LLM client, as opposed to bugs in this service
+def is_upstream_error(exc):
+    return type(exc).__module__.split(".")[0] in ("openai", "groq", "httpx")
+
+class Server:
+    def __init__(self, assistant, max_inflight=API_MAX_INFLIGHT, max_queue=API_MAX_QUEUE, timeout=API_REQUEST_TIMEOUT):
+        self.assistant = assistant
+        self.slots = asyncio.Semaphore(max_inflight)
+        self.capacity = max_inflight + max_queue
+        self.timeout = timeout
+        # Admitted requests, running or waiting for a slot
+        self.pending = 0
+
+    async def run(self, handler, body):
+        async with self.slots:
+            return await handler(body)
+
+    async def dispatch(self, method, path, body):
+        if path in ("/health", "/metrics"):
+            if method != "GET":
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use GET"}, {"Allow": "GET"}
+            if path == "/metrics":
+                return HTTPStatus.OK, metrics.render_prometheus(), {}
+            return HTTPStatus.OK, {**self.assistant.health(), "pending": self.pending, "capacity": self.capacity}, {}
+        name = ROUTES.get(path)
+        if name is None:
+            return HTTPStatus.NOT_FOUND, {"error": f"unknown path {path}"}, {}
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {"error": "use POST"}, {"Allow": "POST"}
+
+        # Backpressure: shed load up front rather than queue without bound
+        if self.pending >= self.capacity:
+            metrics.count("api_rejected")
+            return HTTPStatus.SERVICE_UNAVAILABLE, {"error": "server busy, retry shortly"}, {"Retry-After": "1"}
+        self.pending += 1
+        started = time.perf_counter()
+        try:
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "body must be JSON")
+            if not isinstance(payload, dict):
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "body must be a JSON object")
+            result = await asyncio.wait_for(self.run(getattr(self.assistant, name), payload), self.timeout)
+            return HTTPStatus.OK, result, {}
+        except HTTPError as exc:
+            return exc.status, {"error": exc.message}, {}
+        except asyncio.TimeoutError:
+            metrics.count("api_timeouts")
+            return HTTPStatus.GATEWAY_TIMEOUT, {"error": f"no result within {self.timeout:g}s"}, {}
+        except Exception as exc:
+            metrics.count("api_errors")
+            print(f"❌ {path} failed: {type(exc).__name__}: {exc}")
+            status = HTTPStatus.BAD_GATEWAY if is_upstream_error(exc) else HTTPStatus.INTERNAL_SERVER_ERROR
+            return status, {"error": f"{type(exc).__name__}: {exc}"}, {}
+        finally:
+            self.pending -= 1
+            metrics.observe(f"api_{name}", time.perf_counter() - started)
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader), API_IDLE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except HTTPError as exc:
+                    await send_response(writer, exc.status, {"error": exc.message}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, version, headers, body = request
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+                status, payload, extra = await self.dispatch(method, path, body)
+                await send_response(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+async def serve(assistant, host=API_HOST, port=API_PORT, max_inflight=API_MAX_INFLIGHT,
+                max_queue=API_MAX_QUEUE, timeout=API_REQUEST_TIMEOUT):
+    server = Server(assistant, max_inflight, max_queue, timeout)
+    # METRICS_PORT also serves the same text on its own port
+    metrics.start_metrics_server()
+    listener = await asyncio.start_server(server.handle, host, port, backlog=1024)
+    print(f"🌐 Helpdesk API on http://{host}:{port} (POST /search, /answer, /summarize-ticket; "
+          f"GET /health, /metrics) — {max_inflight} in flight, {max_queue} queued, {timeout:g}s timeout")
+    async with listener:
+        await listener.serve_forever()
+
+# --------------------------
+# 6. Run
+# --------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Async HTTP API for search, answers and ticket summaries")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    parser.add_argument("--docs", default=DOCS_FOLDER)
+    parser.add_argument("--max-inflight", type=int, default=API_MAX_INFLIGHT)
+    parser.add_argument("--max-queue", type=int, default=API_MAX_QUEUE)
+    parser.add_argument("--timeout", type=float, default=API_REQUEST_TIMEOUT, help="seconds per request")
+    args = parser.parse_args()
+
+    print("🧠 Loading Effivity documentation...")
+    assistant = Assistant(args.docs)
+    print(f"🚀 Startup breakdown:\n{startup.report()}\n")
+    try:
+        asyncio.run(serve(assistant, args.host, args.port, args.max_inflight, args.max_queue, args.timeout))
+    except KeyboardInterrupt:
+        print("👋 Helpdesk API stopped.")
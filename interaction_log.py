@@ -0,0 +1,190 @@
+import os
+import re
+import json
+import time
+import queue
+import atexit
+import argparse
+import datetime
+import threading
+import metrics
+
+# --------------------------
+# 1. Settings
+# --------------------------
+INTERACTION_LOG_PATH = os.getenv("INTERACTION_LOG_PATH", "interactions.jsonl")
+LOG_MAX_BYTES = int(os.getenv("INTERACTION_LOG_MAX_BYTES", str(10 * 1024 * 1024)))
+LOG_BACKUPS = int(os.getenv("INTERACTION_LOG_BACKUPS", "5"))
+FLUSH_INTERVAL = 1.0
+QUEUE_SIZE = 10000
+
+# --------------------------
+# 2. Records
+# --------------------------
+# docs are (doc_name, score) pairs in rank order; timings are seconds per stage,
+# None for a stage that never happened (no token arrived)
+def make_record(query, docs, answer, model=None, timings=None, **extra):
+    record = {
+        "ts": datetime.datetime.now().isoformat(timespec="seconds"),
+        "query": query,
+        "docs": [{"doc": name, "score": None if score is None else round(float(score), 4)} for name, score in docs],
+        "answer": answer,
+        "model": model,
+        "timings": {stage: None if seconds is None else round(seconds, 4)
+                    for stage, seconds in (timings or {}).items()},
+    }
+    record.update(extra)
+    return record
+
+# --------------------------
+# 3. Background JSONL writer
+# --------------------------
+# log() only puts the record on a queue, so a chat turn never waits on disk.
+# A daemon thread drains the queue and appends everything waiting in one
+# write. The file rotates to .1, .2, ... once it passes max_bytes. If the
+# queue is ever full the record is dropped and counted.
+class InteractionLogger:
+    def __init__(self, path=INTERACTION_LOG_PATH, max_bytes=LOG_MAX_BYTES, backups=LOG_BACKUPS,
+                 flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.dropped = 0
+        self.written = 0
+        self.thread = threading.Thread(target=self.run, name="interaction-log", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def log(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            metrics.count("interaction_log_dropped")
+
+    def run(self):
+        closing = False
+        while not closing:
+            batch = []
+            try:
+                batch.append(self.queue.get(timeout=self.flush_interval))
+                while True:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            if None in batch:
+                closing = True
+                batch = [r for r in batch if r is not None]
+            if batch:
+                try:
+                    self.write(batch)
+                except OSError as exc:
+                    self.dropped += len(batch)
+                    print(f"⚠️ Interaction log write failed: {exc}")
+
+    def write(self, batch):
+        lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in batch)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(lines)
+        self.written += len(batch)
+        if os.path.getsize(self.path) >= self.max_bytes:
+            self.rotate()
+
+    def rotate(self):
+        for n in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{n}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{n + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    # Flushes whatever is still queued; safe to call more than once
+    def close(self, timeout=5.0):
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join(timeout)
+
+interaction_logger = None
+logger_lock = threading.Lock()
+
+def get_logger():
+    global interaction_logger
+    with logger_lock:
+        if interaction_logger is None:
+            interaction_logger = InteractionLogger()
+        return interaction_logger
+
+# Turn-level timings also feed the turn_* stage histograms (skipping None)
+def log_interaction(query, docs, answer, model=None, timings=None, **extra):
+    for stage, seconds in (timings or {}).items():
+        if seconds is not None:
+            metrics.observe(f"turn_{stage}", seconds)
+    with metrics.timed("interaction_log"):
+        get_logger().log(make_record(query, docs, answer, model, timings, **extra))
+
+# --------------------------
+# 4. Convert the old ai_history.log
+# --------------------------
+# Blocks look like:
+#   [2025-11-05 06:35:57]
+#   Q: ...
+#   Docs used: a.txt, b.txt      (or "Context used:", optional)
+#   A: ... (may span lines)
+#   ----------
+HEADER_RE = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\]$")
+SEPARATOR_RE = re.compile(r"^-{20,}$")
+
+def parse_history_log(path):
+    record = None
+    field = None
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            header = HEADER_RE.match(line)
+            if header:
+                record = {"ts": header.group(1).replace(" ", "T"), "query": "", "docs": [], "answer": ""}
+                field = None
+            elif record is None:
+                continue
+            elif SEPARATOR_RE.match(line):
+                record["answer"] = record["answer"].strip()
+                yield record
+                record = None
+            elif line.startswith("Q: ") or line == "Q:":
+                record["query"] = line[3:]
+                field = "query"
+            elif line.startswith(("Docs used:", "Context used:")):
+                names = line.split(":", 1)[1]
+                record["docs"] = [{"doc": n.strip(), "score": None} for n in names.split(",") if n.strip()]
+                field = None
+            elif line.startswith("A: ") or line == "A:":
+                record["answer"] = line[3:]
+                field = "answer"
+            elif field:
+                record[field] += "\n" + line
+    if record is not None:
+        record["answer"] = record["answer"].strip()
+        yield record
+
+def convert_history_log(source, dest):
+    count = 0
+    with open(dest, "a", encoding="utf-8") as f:
+        for record in parse_history_log(source):
+            record.update({"model": None, "timings": {}, "source": "ai_history.log"})
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    return count
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert ai_history.log into the JSONL interaction log")
+    parser.add_argument("source", nargs="?", default="ai_history.log")
+    parser.add_argument("--out", default=INTERACTION_LOG_PATH)
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    count = convert_history_log(args.source, args.out)
+    print(f"✅ Converted {count} interaction(s) from {args.source} into {args.out} in {time.perf_counter() - started:.2f}s")
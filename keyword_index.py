@@ -0,0 +1,117 @@
+import os
+import re
+import numpy as np
+
+# --------------------------
+# 1. Tokenizer
+# --------------------------
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Yields (term, character offset) pairs
+def tokenize(text):
+    for match in TOKEN_RE.finditer(text.lower()):
+        yield match.group(), match.start()
+
+# --------------------------
+# 2. BM25 inverted index
+# --------------------------
+# Terms found in more than this share of the docs ("the", "to", ...) have the
+# longest posting lists and the lowest idf, so they are skipped whenever the
+# query has at least one rarer term
+KEYWORD_MAX_DF = float(os.getenv("KEYWORD_MAX_DF", "0.5"))
+
+# Built once at load time. Each term's postings are three NumPy arrays: doc
+# ids (ascending), precomputed BM25 weights and the offset of the first
+# occurrence, so a query is one vectorized add per term and snippets come
+# straight from the index without rescanning the document text.
+class KeywordIndex:
+    def __init__(self, docs, k1=1.5, b=0.75, max_df=KEYWORD_MAX_DF):
+        self.k1 = k1
+        self.b = b
+        self.max_df = max_df
+        self.names = list(docs)
+        self.docs = docs
+
+        # One entry per (doc, term) pair, in doc order; grouped by term below
+        vocab = {}
+        term_ids, doc_ids, tfs, offsets = [], [], [], []
+        doc_lens = []
+        for doc_id, name in enumerate(self.names):
+            counts = {}
+            length = 0
+            for term, offset in tokenize(docs[name]):
+                length += 1
+                if term in counts:
+                    counts[term][0] += 1
+                else:
+                    counts[term] = [1, offset]
+            doc_lens.append(length)
+            for term, (tf, offset) in counts.items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc_id)
+                tfs.append(tf)
+                offsets.append(offset)
+
+        n = len(self.names)
+        self.doc_lens = np.array(doc_lens, dtype=np.float32)
+        self.avg_len = float(self.doc_lens.mean()) if n else 0.0
+        term_ids = np.array(term_ids, dtype=np.int64)
+        df = np.bincount(term_ids, minlength=len(vocab))
+        idf = np.log(1 + (n - df + 0.5) / (df + 0.5))
+        self.idf = dict(zip(vocab, idf.tolist()))
+
+        # A stable sort by term keeps each term's doc ids ascending
+        order = np.argsort(term_ids, kind="stable")
+        ids = np.array(doc_ids, dtype=np.int32)[order]
+        tf = np.array(tfs, dtype=np.float32)[order]
+        norm = k1 * (1 - b + b * self.doc_lens[ids] / max(self.avg_len, 1e-9))
+        weights = (idf[term_ids[order]] * tf * (k1 + 1) / (tf + norm)).astype(np.float32)
+        offsets = np.array(offsets, dtype=np.int64)[order]
+        bounds = np.concatenate([[0], np.cumsum(df)]).tolist()
+        self.postings = {
+            term: (ids[start:end], weights[start:end], offsets[start:end])
+            for term, start, end in zip(vocab, bounds, bounds[1:])
+        }
+
+    def __len__(self):
+        return len(self.names)
+
+    # Returns [(name, score, snippet_offset), ...] ranked by BM25 score
+    def search(self, query, top_k=5):
+        terms = [term for term in dict.fromkeys(term for term, _ in tokenize(query)) if term in self.postings]
+        if not terms or top_k <= 0:
+            return []
+        limit = self.max_df * len(self.names)
+        terms = [term for term in terms if len(self.postings[term][0]) <= limit] or terms
+
+        scores = np.zeros(len(self.names), dtype=np.float32)
+        for term in terms:
+            ids, weights, _ = self.postings[term]
+            # A doc occurs at most once per posting list, so a fancy-index add is exact
+            scores[ids] += weights
+        hits = np.flatnonzero(scores)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        # Best score first, ties in doc order
+        hits = hits[np.lexsort((hits, -scores[hits]))]
+
+        # Snippet is anchored on the rarest query term found in the doc
+        by_idf = sorted(terms, key=self.idf.get, reverse=True)
+        results = []
+        for doc_id in hits:
+            for term in by_idf:
+                ids, _, offsets = self.postings[term]
+                i = np.searchsorted(ids, doc_id)
+                if i < len(ids) and ids[i] == doc_id:
+                    results.append((self.names[doc_id], float(scores[doc_id]), int(offsets[i])))
+                    break
+        return results
+
+# --------------------------
+# 3. Snippet search (used by the CLI scripts)
+# --------------------------
+def snippet(index, name, offset, snippet_chars=300):
+    return index.docs[name][max(0, offset - 80):offset + snippet_chars]
+
+def search_docs(query, index, top_k=5, snippet_chars=300):
+    return [(name, snippet(index, name, offset, snippet_chars)) for name, _, offset in index.search(query, top_k)]
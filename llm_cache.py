@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import metrics
+
+# --------------------------
+# 1. Settings
+# --------------------------
+# Lives next to ai_support_knowledge.db in its own file, so cache churn never
+# contends with ticket ingestion for the write lock.
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600)))
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+# --------------------------
+# 2. Keys
+# --------------------------
+def normalize_messages(messages):
+    return [{"role": m["role"], "content": " ".join(str(m["content"]).split())} for m in messages]
+
+def cache_key(model, messages):
+    payload = json.dumps({"model": model, "messages": normalize_messages(messages)}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+# Changes whenever any doc is added, removed or edited
+def docs_fingerprint(docs):
+    digest = hashlib.sha256()
+    for name in sorted(docs):
+        digest.update(name.encode("utf-8"))
+        digest.update(hashlib.sha256(docs[name].encode("utf-8")).digest())
+    return digest.hexdigest()
+
+# --------------------------
+# 3. SQLite response cache
+# --------------------------
+# Entries expire after ttl seconds and the least recently used ones are evicted
+# beyond max_entries. Answers grounded in docs carry the docs fingerprint and
+# are dropped when the docs change; docs_version=None is for prompts that do
+# not depend on docs (e.g. ticket summaries).
+class ResponseCache:
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES, docs_version=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.docs_version = docs_version
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        self.conn.execute("PRAGMA synchronous = NORMAL")
+        self.conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            cache_key TEXT PRIMARY KEY,
+            model TEXT,
+            docs_version TEXT,
+            response TEXT,
+            created_at REAL,
+            last_access REAL,
+            hits INTEGER DEFAULT 0
+        );
+        """)
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache(last_access)")
+        if docs_version is not None:
+            self.invalidate_stale_docs()
+        self.conn.commit()
+
+    def get(self, model, messages):
+        key = cache_key(model, messages)
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created_at, docs_version FROM llm_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] <= self.ttl and row[2] == self.docs_version:
+                self.conn.execute(
+                    "UPDATE llm_cache SET last_access = ?, hits = hits + 1 WHERE cache_key = ?", (now, key)
+                )
+                self.conn.commit()
+                self.hits += 1
+                metrics.count("response_cache_hits")
+                return row[0]
+            if row:
+                self.conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (key,))
+                self.conn.commit()
+            self.misses += 1
+            metrics.count("response_cache_misses")
+            return None
+
+    def put(self, model, messages, response):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (cache_key, model, docs_version, response, created_at, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key(model, messages), model, self.docs_version, response, now, now)
+            )
+            self.evict(now)
+            self.conn.commit()
+
+    def evict(self, now):
+        self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        count = self.conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        if count > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM llm_cache WHERE cache_key IN "
+                "(SELECT cache_key FROM llm_cache ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def invalidate_stale_docs(self):
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM llm_cache WHERE docs_version IS NOT NULL AND docs_version != ?", (self.docs_version,)
+            )
+            self.conn.commit()
+
+    def set_docs_version(self, docs_version):
+        self.docs_version = docs_version
+        self.invalidate_stale_docs()
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
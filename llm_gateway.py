@@ -0,0 +1,235 @@
+import os
+import time
+import asyncio
+import threading
+import weakref
+from collections import deque
+import httpx
+import metrics
+
+# --------------------------
+# 1. Settings
+# --------------------------
+# LLM_BACKEND picks the provider for every entry point:
+#   groq   - Groq cloud (GROQ_API_KEY)
+#   openai - OpenAI (OPENAI_API_KEY), as in ai_test.py
+#   stub   - any local OpenAI-compatible server, e.g. stub_llm_server.py
+LLM_BACKEND = os.getenv("LLM_BACKEND", "groq")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "32"))
+STUB_LLM_URL = os.getenv("STUB_LLM_URL", "http://127.0.0.1:8765/v1")
+
+DEFAULT_MODELS = {
+    "groq": "llama-3.1-8b-instant",
+    "openai": "gpt-3.5-turbo",
+    "stub": "llama-3.1-8b-instant",
+}
+
+def default_model(backend=None):
+    return os.getenv("LLM_MODEL") or DEFAULT_MODELS[backend or LLM_BACKEND]
+
+# --------------------------
+# 2. Long-lived pooled clients
+# --------------------------
+# One client per backend for the life of the process, so keep-alive
+# connections (and their TLS sessions) are reused across questions. Sync
+# clients are thread-safe and shared by all Streamlit sessions. Async clients
+# are bound to an event loop, so they are kept per loop, and they never retry
+# on their own: callers such as async_summarizer own the backoff policy.
+clients = {}
+async_clients = weakref.WeakKeyDictionary()
+clients_lock = threading.Lock()
+
+def make_client(backend, is_async):
+    timeout = httpx.Timeout(LLM_TIMEOUT, connect=5.0)
+    limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+    http_client = (httpx.AsyncClient if is_async else httpx.Client)(limits=limits, timeout=timeout)
+    max_retries = 0 if is_async else 2
+
+    if backend == "groq":
+        from groq import AsyncGroq, Groq
+        return (AsyncGroq if is_async else Groq)(
+            api_key=os.getenv("GROQ_API_KEY"), timeout=timeout, max_retries=max_retries, http_client=http_client
+        )
+    if backend in ("openai", "stub"):
+        from openai import AsyncOpenAI, OpenAI
+        api_key = "stub" if backend == "stub" else os.getenv("OPENAI_API_KEY")
+        base_url = STUB_LLM_URL if backend == "stub" else None
+        return (AsyncOpenAI if is_async else OpenAI)(
+            api_key=api_key, base_url=base_url, timeout=timeout, max_retries=max_retries, http_client=http_client
+        )
+    raise ValueError(f"Unknown LLM backend: {backend} (expected one of {', '.join(DEFAULT_MODELS)})")
+
+def get_client(backend=None):
+    backend = backend or LLM_BACKEND
+    with clients_lock:
+        if backend not in clients:
+            clients[backend] = make_client(backend, is_async=False)
+        return clients[backend]
+
+def get_async_client(backend=None):
+    backend = backend or LLM_BACKEND
+    per_loop = async_clients.setdefault(asyncio.get_running_loop(), {})
+    if backend not in per_loop:
+        per_loop[backend] = make_client(backend, is_async=True)
+    return per_loop[backend]
+
+# --------------------------
+# 3. Per-call latency and token usage
+# --------------------------
+# ttft is the time to the first streamed token (None for non-streamed calls)
+class CallLog:
+    def __init__(self, maxlen=2000):
+        self.records = deque(maxlen=maxlen)
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def record(self, backend, model, seconds, usage=None, error=None, ttft=None):
+        prompt = getattr(usage, "prompt_tokens", 0) or 0
+        completion = getattr(usage, "completion_tokens", 0) or 0
+        with self.lock:
+            self.calls += 1
+            self.errors += error is not None
+            self.prompt_tokens += prompt
+            self.completion_tokens += completion
+            self.records.append((backend, model, seconds, prompt, completion, error is None, ttft))
+        metrics.observe("llm_call", seconds)
+        if ttft is not None:
+            metrics.observe("llm_first_token", ttft)
+        metrics.count("llm_calls")
+        metrics.count("llm_prompt_tokens", prompt)
+        metrics.count("llm_completion_tokens", completion)
+        if error is not None:
+            metrics.count("llm_errors")
+
+    def summary(self):
+        with self.lock:
+            latencies = sorted(r[2] for r in self.records)
+            ttfts = sorted(r[6] for r in self.records if r[6] is not None)
+            stats = {
+                "calls": self.calls,
+                "errors": self.errors,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+            }
+            if self.records and self.records[-1][6] is not None:
+                stats["last_ttft"] = self.records[-1][6]
+        if latencies:
+            stats["latency_p50"] = metrics.percentile(latencies, 0.5)
+            stats["latency_p95"] = metrics.percentile(latencies, 0.95)
+        if ttfts:
+            stats["ttft_p50"] = metrics.percentile(ttfts, 0.5)
+            stats["ttft_p95"] = metrics.percentile(ttfts, 0.95)
+        return stats
+
+call_log = CallLog()
+
+# --------------------------
+# 4. Completions
+# --------------------------
+def complete(messages, model=None, backend=None, **kwargs):
+    backend = backend or LLM_BACKEND
+    model = model or default_model(backend)
+    started = time.perf_counter()
+    try:
+        response = get_client(backend).chat.completions.create(model=model, messages=messages, **kwargs)
+    except Exception as exc:
+        call_log.record(backend, model, time.perf_counter() - started, error=exc)
+        raise
+    call_log.record(backend, model, time.perf_counter() - started, response.usage)
+    return response
+
+async def acomplete(messages, model=None, backend=None, **kwargs):
+    backend = backend or LLM_BACKEND
+    model = model or default_model(backend)
+    started = time.perf_counter()
+    try:
+        response = await get_async_client(backend).chat.completions.create(model=model, messages=messages, **kwargs)
+    except Exception as exc:
+        call_log.record(backend, model, time.perf_counter() - started, error=exc)
+        raise
+    call_log.record(backend, model, time.perf_counter() - started, response.usage)
+    return response
+
+# Response-cache entries are namespaced by backend so stub answers never
+# leak into real ones
+def cache_model_key(model=None, backend=None):
+    backend = backend or LLM_BACKEND
+    return f"{backend}:{model or default_model(backend)}"
+
+def chat(messages, model=None, backend=None, cache=None, **kwargs):
+    key = cache_model_key(model, backend)
+    answer = cache.get(key, messages) if cache else None
+    if answer is None:
+        response = complete(messages, model, backend, **kwargs)
+        answer = response.choices[0].message.content.strip()
+        if cache:
+            cache.put(key, messages, answer)
+    return answer
+
+# --------------------------
+# 5. Streaming
+# --------------------------
+def chunk_usage(chunk):
+    usage = getattr(chunk, "usage", None)
+    if usage is None and getattr(chunk, "x_groq", None) is not None:
+        usage = getattr(chunk.x_groq, "usage", None)
+    return usage
+
+# Yields answer text as it is generated. The full answer is assembled for the
+# response cache, and time-to-first-token is recorded in call_log. A cache hit
+# is yielded as a single chunk.
+def stream_chat(messages, model=None, backend=None, cache=None, **kwargs):
+    backend = backend or LLM_BACKEND
+    model = model or default_model(backend)
+    key = cache_model_key(model, backend)
+    cached = cache.get(key, messages) if cache else None
+    if cached is not None:
+        yield cached
+        return
+
+    if backend != "groq":
+        kwargs.setdefault("stream_options", {"include_usage": True})
+    started = time.perf_counter()
+    ttft = None
+    usage = None
+    parts = []
+    try:
+        stream = get_client(backend).chat.completions.create(model=model, messages=messages, stream=True, **kwargs)
+        for chunk in stream:
+            usage = chunk_usage(chunk) or usage
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                if ttft is None:
+                    ttft = time.perf_counter() - started
+                parts.append(text)
+                yield text
+    except Exception as exc:
+        call_log.record(backend, model, time.perf_counter() - started, error=exc, ttft=ttft)
+        raise
+    call_log.record(backend, model, time.perf_counter() - started, usage, ttft=ttft)
+    if cache:
+        cache.put(key, messages, "".join(parts).strip())
+
+# CLI helper: prints chunks as they arrive and returns the full text plus the
+# seconds from `started` (when the question was submitted) to the first chunk
+def echo_stream(chunks, started):
+    parts = []
+    first_token = None
+    for chunk in chunks:
+        if first_token is None:
+            first_token = time.perf_counter() - started
+        print(chunk, end="", flush=True)
+        parts.append(chunk)
+    return "".join(parts).strip(), first_token or 0.0
+
+# CLI helper: response cache hits and LLM time to first token, printed on exit
+def print_session_stats(cache):
+    stats = cache.stats()
+    print(f"💾 Response cache: {stats['hits']} hit(s), {stats['misses']} miss(es).")
+    stats = call_log.summary()
+    if "ttft_p50" in stats:
+        print(f"⏱️ LLM time to first token: p50 {stats['ttft_p50']:.2f}s, p95 {stats['ttft_p95']:.2f}s.")
@@ -0,0 +1,173 @@
+import os
+import time
+import atexit
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --------------------------
+# 1. Settings
+# --------------------------
+# METRICS_ENABLED=0 turns every timer and counter into a no-op.
+# METRICS_PORT serves /metrics in Prometheus text format from a daemon thread,
+# once a long-running entry point calls start_metrics_server().
+# METRICS_DUMP_PATH writes the same text there when the process exits.
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") != "0"
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_DUMP_PATH = os.getenv("METRICS_DUMP_PATH", "")
+METRICS_PREFIX = "helpdesk_"
+# Percentiles come from the most recent samples of each stage
+SAMPLE_WINDOW = 2048
+QUANTILES = (0.5, 0.95, 0.99)
+
+# --------------------------
+# 2. Registry
+# --------------------------
+# Nearest-rank percentile of an already sorted list; also used for the
+# LLM call log and the benchmark reports
+def percentile(sorted_values, q):
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+class Histogram:
+    def __init__(self, window=SAMPLE_WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.samples.append(value)
+        self.count += 1
+        self.sum += value
+
+    def quantiles(self):
+        values = sorted(self.samples)
+        return {q: percentile(values, q) for q in QUANTILES} if values else {}
+
+class Registry:
+    def __init__(self):
+        self.enabled = METRICS_ENABLED
+        self.histograms = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def count(self, name, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self):
+        with self.lock:
+            stages = {
+                name: {"count": h.count, "sum": h.sum, **{f"p{int(q * 100)}": v for q, v in h.quantiles().items()}}
+                for name, h in self.histograms.items()
+            }
+            return stages, dict(self.counters)
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+registry = Registry()
+
+def set_enabled(enabled):
+    registry.enabled = enabled
+
+def observe(name, seconds):
+    registry.observe(name, seconds)
+
+def count(name, value=1):
+    registry.count(name, value)
+
+# --------------------------
+# 3. Stage timer
+# --------------------------
+# with timed("query_encode"): ...
+# Costs two perf_counter calls and one locked deque append per stage.
+class timed:
+    __slots__ = ("name", "started")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter() if registry.enabled else None
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.started is not None:
+            registry.observe(self.name, time.perf_counter() - self.started)
+            if exc_type is not None:
+                registry.count(f"{self.name}_errors")
+        return False
+
+# --------------------------
+# 4. Prometheus text format
+# --------------------------
+def render_prometheus():
+    stages, counters = registry.snapshot()
+    lines = []
+    if stages:
+        name = f"{METRICS_PREFIX}stage_seconds"
+        lines += [f"# HELP {name} Time spent per pipeline stage.", f"# TYPE {name} summary"]
+        for stage, stats in sorted(stages.items()):
+            for q in QUANTILES:
+                key = f"p{int(q * 100)}"
+                if key in stats:
+                    lines.append(f'{name}{{stage="{stage}",quantile="{q}"}} {stats[key]:.6f}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {stats["sum"]:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {stats["count"]}')
+    for counter, value in sorted(counters.items()):
+        name = f"{METRICS_PREFIX}{counter}_total"
+        lines += [f"# TYPE {name} counter", f"{name} {value}"]
+    return "\n".join(lines) + "\n"
+
+def dump(path=METRICS_DUMP_PATH):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(render_prometheus())
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+metrics_server = None
+
+def serve_metrics(port=METRICS_PORT, host="127.0.0.1"):
+    global metrics_server
+    if metrics_server is None:
+        metrics_server = ThreadingHTTPServer((host, port), MetricsHandler)
+        metrics_server.daemon_threads = True
+        threading.Thread(target=metrics_server.serve_forever, name="metrics", daemon=True).start()
+    return metrics_server
+
+# Importing this module never opens a port: helper modules import it too,
+# and so does every worker process that imports them
+def start_metrics_server(port=METRICS_PORT):
+    if METRICS_ENABLED and port:
+        return serve_metrics(port)
+    return None
+
+if METRICS_ENABLED and METRICS_DUMP_PATH:
+    atexit.register(dump)
@@ -0,0 +1,229 @@
+import os
+import re
+from collections import namedtuple
+import numpy as np
+from embedding_cache import cached_encode
+from metrics import timed
+from keyword_index import KeywordIndex
+
+# --------------------------
+# 1. Settings
+# --------------------------
+DOCS_FOLDER = "docs"
+MODEL_NAME = "all-MiniLM-L6-v2"
+# float32 keeps vectors in process memory; float16 or int8 serves them from a
+# shared memory-mapped store instead (see vector_store.py). Not combinable
+# with ANN_INDEX.
+EMBED_STORE_DTYPE = os.getenv("EMBED_STORE_DTYPE", "float32")
+# none, ivf or hnsw; large corpora only (see ann_index.py)
+ANN_INDEX = os.getenv("ANN_INDEX", "none")
+
+# MiniLM truncates at ~256 word pieces, so passages stay well under that
+PASSAGE_WORDS = 120
+PASSAGE_OVERLAP = 30
+# Passages looked up in / written to the embedding cache per round trip
+ENCODE_CHUNK = 4096
+
+# --------------------------
+# 2. Passage splitting
+# --------------------------
+# start/end are character offsets of the passage inside the source document
+Passage = namedtuple("Passage", ["doc", "start", "end", "text"])
+
+def split_passages(doc, text, max_words=PASSAGE_WORDS, overlap=PASSAGE_OVERLAP):
+    words = list(re.finditer(r"\S+", text))
+    passages = []
+    step = max(1, max_words - overlap)
+    for i in range(0, len(words), step):
+        chunk = words[i:i + max_words]
+        start, end = chunk[0].start(), chunk[-1].end()
+        passages.append(Passage(doc, start, end, text[start:end]))
+        if i + max_words >= len(words):
+            break
+    return passages
+
+# --------------------------
+# 3. Embedding matrix
+# --------------------------
+# All passage vectors live in one contiguous, L2-normalized float32 matrix with
+# a parallel passage list, so cosine similarity is a plain dot product.
+class DocIndex:
+    def __init__(self, passages, matrix):
+        self.passages = passages
+        self.matrix = matrix
+
+    def __len__(self):
+        return len(self.passages)
+
+    @property
+    def dim(self):
+        return self.matrix.shape[1]
+
+    def scores(self, queries):
+        return queries @ self.matrix.T
+
+    # (row, score) pairs for one query; quantized indexes re-score here
+    def top_hits(self, query, scores, top_k):
+        return [(int(i), float(scores[i])) for i in top_k_indices(scores, top_k)]
+
+    # One [(row, score), ...] list per normalized query; ANN indexes override this
+    def search(self, queries, top_k):
+        return [self.top_hits(query, row, top_k) for query, row in zip(queries, self.scores(queries))]
+
+    def add(self, passages, vectors):
+        self.passages = self.passages + list(passages)
+        self.matrix = np.vstack([self.matrix, normalize(np.atleast_2d(vectors))])
+
+def normalize(vectors):
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+def passage_key(docs_folder, passage):
+    return f"{os.path.join(docs_folder, passage.doc)}#{passage.start}-{passage.end}"
+
+# Encodes through the cache ENCODE_CHUNK passages at a time, writing each
+# chunk's normalized vectors straight into out (or a new matrix), so only one
+# chunk of vectors is ever held outside it
+def encode_passages(model, passages, docs_folder=DOCS_FOLDER, out=None, chunk=ENCODE_CHUNK):
+    if out is None:
+        out = np.zeros((len(passages), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    encoded = 0
+    for start in range(0, len(passages), chunk):
+        part = passages[start:start + chunk]
+        keys = [passage_key(docs_folder, p) for p in part]
+        vectors, n = cached_encode(model, MODEL_NAME, {k: p.text for k, p in zip(keys, part)})
+        out[start:start + len(part)] = normalize(np.stack([vectors[k] for k in keys]))
+        encoded += n
+    return out, encoded
+
+# IVF and HNSW keep their own float32 copy of every vector, which would pull
+# a whole quantized store into memory and undo the quantization
+def check_index_settings(store_dtype, ann):
+    if store_dtype != "float32" and ann != "none":
+        raise ValueError(f"ANN_INDEX={ann} needs EMBED_STORE_DTYPE=float32 (got {store_dtype}); "
+                         f"use one or the other")
+
+def build_passage_index(model, docs, docs_folder=DOCS_FOLDER, store_dtype=EMBED_STORE_DTYPE, ann=ANN_INDEX):
+    check_index_settings(store_dtype, ann)
+    if store_dtype != "float32":
+        from vector_store import build_store_index
+        index, encoded = build_store_index(model, docs, docs_folder, store_dtype)
+    else:
+        passages = [p for name, text in docs.items() for p in split_passages(name, text)]
+        matrix, encoded = encode_passages(model, passages, docs_folder)
+        index = DocIndex(passages, matrix)
+    if ann != "none":
+        from ann_index import build_ann_index
+        index = build_ann_index(index, ann)
+    return index, encoded
+
+# Rebuilds the index after docs were added, edited or removed, re-encoding
+# only the passages of those docs; other rows are copied from the old index.
+# Quantized and ANN indexes are rebuilt (still through the embedding cache); a
+# quantized rebuild publishes a new version next to the old one, so the old
+# snapshot's mapped files stay untouched while it is still being searched.
+def update_passage_index(model, index, docs, changed, removed=(), docs_folder=DOCS_FOLDER):
+    if getattr(index, "path", None):
+        from vector_store import build_store_index, store_location
+        store_dir, dtype = store_location(index.path)
+        return build_store_index(model, docs, docs_folder, dtype, store_dir)
+    if type(index) is not DocIndex:
+        return build_passage_index(model, docs, docs_folder, "float32")
+    stale = set(changed) | set(removed)
+    keep = [i for i, p in enumerate(index.passages) if p.doc not in stale]
+    added = [p for name in changed if name in docs for p in split_passages(name, docs[name])]
+    matrix = np.empty((len(keep) + len(added), index.dim), dtype=np.float32)
+    matrix[:len(keep)] = index.matrix[keep]
+    _, encoded = encode_passages(model, added, docs_folder, out=matrix[len(keep):])
+    return DocIndex([index.passages[i] for i in keep] + added, matrix), encoded
+
+# --------------------------
+# 4. Top-k search
+# --------------------------
+def top_k_indices(scores, top_k):
+    k = min(top_k, scores.shape[-1])
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+# query_vectors is (d,) or (Q, d); returns one [(row, score), ...] list per query
+def search_vectors(index, query_vectors, top_k=3):
+    return index.search(normalize(np.atleast_2d(query_vectors)), top_k)
+
+def search_passages(query, model, index, top_k=3):
+    query_vector = model.encode(query, convert_to_numpy=True)
+    return [(index.passages[i], score) for i, score in search_vectors(index, query_vector, top_k)[0]]
+
+def semantic_search(query, model, index, top_k=3):
+    return [(p.doc, p.text) for p, _ in search_passages(query, model, index, top_k)]
+
+def semantic_search_batch(queries, model, index, top_k=3):
+    query_vectors = model.encode(queries, batch_size=64, convert_to_numpy=True)
+    return [
+        [(index.passages[i].doc, index.passages[i].text) for i, _ in hits]
+        for hits in search_vectors(index, query_vectors, top_k)
+    ]
+
+# --------------------------
+# 5. Hybrid retrieval
+# --------------------------
+SEARCH_MODES = ("semantic", "keyword", "hybrid")
+
+# Reciprocal rank fusion constant, and the corpus size above which the dense
+# scorer only looks at keyword candidates instead of every passage.
+RRF_K = 60
+PREFILTER_MIN_PASSAGES = 20000
+PREFILTER_CANDIDATES = 1000
+
+# BM25 and dense search over the same passages, fused by reciprocal rank
+class HybridRetriever:
+    def __init__(self, model, index):
+        self.model = model
+        self.index = index
+        self.keyword = KeywordIndex({i: p.text for i, p in enumerate(index.passages)})
+
+    def keyword_hits(self, query, top_k):
+        with timed("keyword_search"):
+            return [(row, score) for row, score, _ in self.keyword.search(query, top_k)]
+
+    def encode(self, query):
+        with timed("query_encode"):
+            return normalize(self.model.encode(query, convert_to_numpy=True))
+
+    def dense_hits(self, query_vector, top_k, candidates=None):
+        with timed("dense_search"):
+            if candidates is None:
+                return search_vectors(self.index, query_vector, top_k)[0]
+            rows = np.fromiter(candidates, dtype=np.int64)
+            scores = self.index.matrix[rows] @ query_vector
+            return [(int(rows[i]), float(scores[i])) for i in top_k_indices(scores, top_k)]
+
+    # Returns [(Passage, score), ...]; the score is cosine, BM25 or RRF by mode.
+    # Pass query_vector when the caller already encoded the query.
+    def search(self, query, mode="hybrid", top_k=3, query_vector=None):
+        if mode != "keyword" and query_vector is None:
+            query_vector = self.encode(query)
+        if mode == "keyword":
+            hits = self.keyword_hits(query, top_k)
+        elif mode == "semantic":
+            hits = self.dense_hits(query_vector, top_k)
+        else:
+            depth = max(top_k * 10, 50)
+            keyword = self.keyword_hits(query, max(depth, PREFILTER_CANDIDATES))
+            candidates = None
+            if len(self.index) > PREFILTER_MIN_PASSAGES and keyword:
+                candidates = [row for row, _ in keyword]
+            dense = self.dense_hits(query_vector, depth, candidates)
+
+            with timed("rank_fusion"):
+                fused = {}
+                for ranked in (keyword[:depth], dense):
+                    for rank, (row, _) in enumerate(ranked):
+                        fused[row] = fused.get(row, 0.0) + 1.0 / (RRF_K + rank + 1)
+                hits = sorted(fused.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        return [(self.index.passages[row], score) for row, score in hits]
+
+def hybrid_search(query, retriever, mode="hybrid", top_k=3, query_vector=None):
+    return [(p.doc, p.text) for p, _ in retriever.search(query, mode, top_k, query_vector)]
@@ -0,0 +1,97 @@
+import os
+import re
+import time
+import threading
+import numpy as np
+import metrics
+
+# --------------------------
+# 1. Settings
+# --------------------------
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1000"))
+
+# Words that usually point back at earlier turns ("what about that one?")
+FOLLOW_UP_WORDS = {
+    "it", "its", "that", "this", "these", "those", "they", "them", "their",
+    "he", "she", "above", "previous", "again", "also", "else", "more", "same",
+}
+WORD_RE = re.compile(r"[a-z']+")
+
+# A question is only safe to answer from cache when it stands on its own
+def is_context_dependent(query, history):
+    if not history:
+        return False
+    words = WORD_RE.findall(query.lower())
+    if words[:1] in (["and"], ["but"], ["so"]) or words[:2] in (["what", "about"], ["how", "about"]):
+        return True
+    return bool(FOLLOW_UP_WORDS.intersection(words))
+
+# --------------------------
+# 2. Semantic answer cache
+# --------------------------
+# Query vectors (already L2-normalized by the retriever) sit in one fixed-size
+# matrix, so a lookup is a single matrix-vector product. A hit needs cosine
+# similarity >= threshold and the same retrieved doc set, so a paraphrase that
+# lands on different docs still goes to the LLM. Least recently used entries
+# are overwritten when the matrix is full.
+class SemanticCache:
+    def __init__(self, dim, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_SIZE):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.matrix = np.zeros((max_entries, dim), dtype=np.float32)
+        self.entries = [None] * max_entries
+        self.last_used = np.zeros(max_entries)
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self.lock = threading.Lock()
+
+    def lookup(self, query_vector, doc_set, query="", history=None):
+        if is_context_dependent(query, history):
+            self.skipped += 1
+            metrics.count("semantic_cache_skipped")
+            return None
+        with self.lock:
+            if self.size:
+                scores = self.matrix[:self.size] @ query_vector
+                above = np.flatnonzero(scores >= self.threshold)
+                for slot in above[np.argsort(-scores[above])]:
+                    _, cached_docs, answer = self.entries[slot]
+                    if cached_docs == doc_set:
+                        self.last_used[slot] = time.monotonic()
+                        self.hits += 1
+                        metrics.count("semantic_cache_hits")
+                        return answer
+            self.misses += 1
+            metrics.count("semantic_cache_misses")
+            return None
+
+    def store(self, query_vector, doc_set, query, answer, history=None):
+        if is_context_dependent(query, history):
+            return
+        with self.lock:
+            if self.size < self.max_entries:
+                slot = self.size
+                self.size += 1
+            else:
+                slot = int(np.argmin(self.last_used))
+            self.matrix[slot] = query_vector
+            self.entries[slot] = (query, doc_set, answer)
+            self.last_used[slot] = time.monotonic()
+
+    def clear(self):
+        with self.lock:
+            self.size = 0
+            self.entries = [None] * self.max_entries
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "skipped": self.skipped,
+            "entries": self.size,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -1,46 +1,21 @@
-import os
-import datetime
-import numpy as np
-from groq import Groq
-from sentence_transformers import SentenceTransformer, util
+import argparse
+import time
+from llm_cache import ResponseCache, docs_fingerprint
+from llm_gateway import default_model, echo_stream, print_session_stats, stream_chat
+from interaction_log import log_interaction
+from doc_ingest import ingest
+from startup import in_background, load_embedding_model, startup
+from retrieval import SEARCH_MODES, HybridRetriever
 
 # --------------------------
 # 1. Load documents
 # --------------------------
 DOCS_FOLDER = "docs"
 
-def load_docs():
-    docs = {}
-    for file_name in os.listdir(DOCS_FOLDER):
-        if file_name.endswith(".txt"):
-            with open(os.path.join(DOCS_FOLDER, file_name), "r", encoding="utf-8") as f:
-                docs[file_name] = f.read()
-    return docs
-
-# --------------------------
-# 2. Create embeddings for docs
-# --------------------------
-def build_doc_embeddings(model, docs):
-    embeddings = {}
-    for name, text in docs.items():
-        embeddings[name] = model.encode(text, convert_to_tensor=True)
-    return embeddings
-
 # --------------------------
-# 3. Search docs semantically
+# 2. Ask the AI with context
 # --------------------------
-def semantic_search(query, model, docs, doc_embeddings, top_k=2):
-    query_embedding = model.encode(query, convert_to_tensor=True)
-    similarities = {name: util.cos_sim(query_embedding, emb).item() for name, emb in doc_embeddings.items()}
-    sorted_docs = sorted(similarities.items(), key=lambda x: x[1], reverse=True)
-    top_matches = sorted_docs[:top_k]
-    return [(name, docs[name]) for name, _ in top_matches]
-
-# --------------------------
-# 4. Ask Groq AI with context
-# --------------------------
-def ask_ai(query, context):
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+def ask_ai(query, context, cache=None):
     prompt = f"""
     You are an Effivity support assistant.
     Use the provided documentation context to answer the user's question clearly.
@@ -53,39 +28,48 @@ def ask_ai(query, context):
 
     If the context doesn't include the answer, say 'The documentation does not cover this topic.'
     """
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=[{"role": "user", "content": prompt}]
-    )
-    return response.choices[0].message.content.strip()
+    return stream_chat([{"role": "user", "content": prompt}], cache=cache)
 
 # --------------------------
-# 5. Main logic
+# 3. Main logic
 # --------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="semantic")
+    args = parser.parse_args()
+
     print("🔍 Loading Effivity documentation...")
-    docs = load_docs()
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    doc_embeddings = build_doc_embeddings(model, docs)
-    print(f"✅ Loaded and embedded {len(docs)} documents.\n")
+    # Extraction starts right away; passages are encoded once the model has loaded
+    model_future = in_background("embedding-warmup", load_embedding_model)
+    with startup.phase("ingest docs"):
+        docs, doc_index, ingest_stats = ingest(model_future, DOCS_FOLDER)
+    print(ingest_stats.report())
+    print(f"♻️ Reused {len(doc_index) - ingest_stats.encoded} cached passage embeddings, "
+          f"encoded {ingest_stats.encoded} new/edited passage(s).")
+    with startup.phase("response cache"):
+        cache = ResponseCache(docs_version=docs_fingerprint(docs))
+    model = model_future.result()
+    retriever = HybridRetriever(model, doc_index)
+    print(f"✅ Loaded and embedded {len(docs)} documents ({args.mode} search).")
+    print(f"🚀 Startup breakdown:\n{startup.report()}\n")
 
     while True:
         query = input("💬 Ask Effivity AI (or 'exit' to quit): ")
         if query.lower() == "exit":
+            print_session_stats(cache)
             break
 
-        matches = semantic_search(query, model, docs, doc_embeddings)
-        context = "\n---\n".join([f"{name}:\n{text[:1000]}" for name, text in matches])
+        started = time.perf_counter()
+        hits = retriever.search(query, args.mode)
+        matches = [(p.doc, p.text) for p, _ in hits]
+        retrieved = time.perf_counter() - started
+        context = "\n---\n".join([f"{name}:\n{text}" for name, text in matches])
 
-        answer = ask_ai(query, context)
-        print(f"\n🤖 AI Answer:\n{answer}\n{'-'*80}\n")
+        print("\n🤖 AI Answer:")
+        answer, first_token = echo_stream(ask_ai(query, context, cache), started)
+        total = time.perf_counter() - started
+        print(f"\n⏱️ First token after {first_token:.2f}s, total {total:.2f}s\n{'-'*80}\n")
 
-        # Log interaction
-        log_entry = (
-            f"\n[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]\n"
-            f"Q: {query}\n"
-            f"Docs used: {', '.join([n for n, _ in matches])}\n"
-            f"A: {answer}\n{'-'*80}\n"
-        )
-        with open("ai_history.log", "a", encoding="utf-8") as f:
-            f.write(log_entry)
+        # Appended to interactions.jsonl off the input loop
+        timings = {"retrieve": retrieved, "first_token": first_token, "total": total}
+        log_interaction(query, [(p.doc, score) for p, score in hits], answer, default_model(), timings, mode=args.mode)
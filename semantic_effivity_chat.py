@@ -1,95 +1,94 @@
-import os
-import datetime
-from groq import Groq
-from sentence_transformers import SentenceTransformer, util
+import argparse
+import time
+from semantic_cache import SemanticCache
+from llm_cache import ResponseCache, docs_fingerprint
+from llm_gateway import default_model, echo_stream, print_session_stats, stream_chat
+from interaction_log import log_interaction
+from context_builder import Conversation, build_messages
+from doc_ingest import ingest
+from startup import in_background, load_embedding_model, startup
+from retrieval import SEARCH_MODES, HybridRetriever
 
 # --------------------------
 # 1. Load documentation
 # --------------------------
+# HTML, DOCX and PDF files in any subfolder are indexed alongside the .txt guides
 DOCS_FOLDER = "docs"
 
-def load_docs():
-    docs = {}
-    for file_name in os.listdir(DOCS_FOLDER):
-        if file_name.endswith(".txt"):
-            with open(os.path.join(DOCS_FOLDER, file_name), "r", encoding="utf-8") as f:
-                docs[file_name] = f.read()
-    return docs
-
-# --------------------------
-# 2. Build semantic embeddings
-# --------------------------
-def build_doc_embeddings(model, docs):
-    embeddings = {}
-    for name, text in docs.items():
-        embeddings[name] = model.encode(text, convert_to_tensor=True)
-    return embeddings
-
-# --------------------------
-# 3. Semantic search
-# --------------------------
-def semantic_search(query, model, docs, doc_embeddings, top_k=2):
-    query_embedding = model.encode(query, convert_to_tensor=True)
-    similarities = {name: util.cos_sim(query_embedding, emb).item() for name, emb in doc_embeddings.items()}
-    sorted_docs = sorted(similarities.items(), key=lambda x: x[1], reverse=True)
-    top_matches = sorted_docs[:top_k]
-    return [(name, docs[name]) for name, _ in top_matches]
-
 # --------------------------
-# 4. Ask Groq AI with conversation context
+# 2. Ask the AI with conversation context
 # --------------------------
-def ask_ai(client, chat_history, query, context):
+def ask_ai(conversation, query, matches, cache=None):
     system_prompt = (
         "You are an Effivity support assistant. "
         "Use the provided documentation context and prior conversation to help the user clearly and accurately. "
         "If something isn't in the docs, say so honestly."
     )
 
-    messages = [{"role": "system", "content": system_prompt}] + chat_history
-    messages.append({"role": "user", "content": f"Context:\n{context}\n\nQuestion:\n{query}"})
-
-    response = client.chat.completions.create(
-        model="llama-3.1-8b-instant",
-        messages=messages
-    )
-    return response.choices[0].message.content.strip()
+    # build_messages drops the weakest passages and oldest turns first
+    messages = build_messages(system_prompt, query, matches, conversation)
+    return stream_chat(messages, cache=cache)
 
 # --------------------------
-# 5. Main interaction loop
+# 3. Main interaction loop
 # --------------------------
 if __name__ == "__main__":
-    print("🧠 Loading Effivity documentation...")
-    docs = load_docs()
-    model = SentenceTransformer('all-MiniLM-L6-v2')
-    doc_embeddings = build_doc_embeddings(model, docs)
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-
-    print(f"✅ Loaded and embedded {len(docs)} documents.\n")
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mode", choices=SEARCH_MODES, default="semantic")
+    args = parser.parse_args()
 
-    chat_history = []
+    print("🧠 Loading Effivity documentation...")
+    # Docs are extracted while the model warms up; encoding starts once it is ready
+    model_future = in_background("embedding-warmup", load_embedding_model)
+    with startup.phase("ingest docs"):
+        docs, doc_index, ingest_stats = ingest(model_future, DOCS_FOLDER)
+    print(ingest_stats.report())
+    print(f"♻️ Reused {len(doc_index) - ingest_stats.encoded} cached passage embeddings, "
+          f"encoded {ingest_stats.encoded} new/edited passage(s).")
+    with startup.phase("response cache"):
+        cache = ResponseCache(docs_version=docs_fingerprint(docs))
+    model = model_future.result()
+    retriever = HybridRetriever(model, doc_index)
+    answer_cache = SemanticCache(doc_index.dim)
+    print(f"✅ Loaded and embedded {len(docs)} documents ({args.mode} search).")
+    print(f"🚀 Startup breakdown:\n{startup.report()}\n")
+
+    # Older turns are folded into a rolling summary in the background
+    conversation = Conversation()
 
     while True:
         query = input("💬 You: ")
         if query.lower() == "exit":
+            print_session_stats(cache)
+            stats = answer_cache.stats()
+            print(f"🧲 Semantic cache: {stats['hits']} hit(s), {stats['misses']} miss(es), "
+                  f"{stats['skipped']} follow-up(s) skipped ({stats['hit_rate']:.0%} hit rate).")
             break
 
-        matches = semantic_search(query, model, docs, doc_embeddings)
-        context = "\n---\n".join([f"{name}:\n{text[:800]}" for name, text in matches])
-        answer = ask_ai(client, chat_history, query, context)
-
-        print(f"\n🤖 AI: {answer}\n{'-'*80}\n")
+        started = time.perf_counter()
+
+        # Encoded once: retrieval and the answer cache lookup both use it
+        query_vector = retriever.encode(query)
+        hits = retriever.search(query, args.mode, query_vector=query_vector)
+        matches = [(p.doc, p.text) for p, _ in hits]
+        retrieved = time.perf_counter() - started
+        doc_set = frozenset(name for name, _ in matches)
+        answer = answer_cache.lookup(query_vector, doc_set, query, conversation.turns)
+        print("\n🤖 AI: ", end="", flush=True)
+        cached = answer is not None
+        if not cached:
+            answer, first_token = echo_stream(ask_ai(conversation, query, matches, cache), started)
+            answer_cache.store(query_vector, doc_set, query, answer, conversation.turns)
+        else:
+            print(answer, end="")
+            first_token = time.perf_counter() - started
+        total = time.perf_counter() - started
+        print(f"\n⏱️ First token after {first_token:.2f}s, total {total:.2f}s\n{'-'*80}\n")
 
         # Update conversation memory
-        chat_history.append({"role": "user", "content": query})
-        chat_history.append({"role": "assistant", "content": answer})
-
-        # Limit memory to last 6 exchanges
-        if len(chat_history) > 12:
-            chat_history = chat_history[-12:]
+        conversation.add_turn(query, answer)
 
-        # Log everything
-        with open("ai_history.log", "a", encoding="utf-8") as f:
-            f.write(
-                f"\n[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}]\n"
-                f"Q: {query}\nA: {answer}\n{'-'*80}\n"
-            )
+        # Logged asynchronously, with whether the semantic cache answered
+        timings = {"retrieve": retrieved, "first_token": first_token, "total": total}
+        log_interaction(query, [(p.doc, score) for p, score in hits], answer, default_model(), timings,
+                        mode=args.mode, semantic_cache_hit=cached)
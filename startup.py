@@ -0,0 +1,73 @@
+import time
+import threading
+from concurrent.futures import Future
+from retrieval import MODEL_NAME
+
+# --------------------------
+# 1. Startup phase timer
+# --------------------------
+# Phases may overlap (the embedding model loads on a background thread while
+# docs are read), so each one is reported with its own start offset.
+class StartupTimer:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        self.lock = threading.Lock()
+
+    def phase(self, name):
+        return Phase(self, name)
+
+    def record(self, name, offset, seconds):
+        with self.lock:
+            self.phases.append((name, offset, seconds, threading.current_thread().name))
+
+    def report(self):
+        with self.lock:
+            phases = sorted(self.phases, key=lambda p: p[1])
+        lines = [f"  {name:<32} +{offset:6.2f}s  {seconds:6.2f}s  ({thread})" for name, offset, seconds, thread in phases]
+        if phases:
+            ready = max(offset + seconds for _, offset, seconds, _ in phases)
+            lines.append(f"  {'all phases done after':<32} {ready:7.2f}s")
+        return "\n".join(lines)
+
+class Phase:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.timer.record(self.name, self.t0 - self.timer.started, time.perf_counter() - self.t0)
+        return False
+
+startup = StartupTimer()
+
+# --------------------------
+# 2. Background warm-up
+# --------------------------
+def in_background(name, fn, *args):
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except BaseException as exc:
+            future.set_exception(exc)
+
+    threading.Thread(target=run, name=name, daemon=True).start()
+    return future
+
+# torch and sentence_transformers are only imported here, so keyword-only
+# paths never pay for them. The first encode() is done up front because it
+# is several times slower than the ones after it.
+def load_embedding_model(name=MODEL_NAME):
+    with startup.phase("import sentence_transformers"):
+        from sentence_transformers import SentenceTransformer
+    with startup.phase(f"load {name}"):
+        model = SentenceTransformer(name)
+    with startup.phase("first encode"):
+        model.encode("warm up", convert_to_numpy=True)
+    return model
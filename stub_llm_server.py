@@ -0,0 +1,130 @@
+import json
+import time
+import random
+import argparse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# --------------------------
+# 1. OpenAI-compatible stub
+# --------------------------
+# Answers POST .../chat/completions (both the Groq /openai/v1 and the plain /v1
+# paths) after a configurable delay, optionally failing with 429 or 503, so the
+# pipeline can be load-tested offline:
+#   python stub_llm_server.py --port 8765 --latency 0.5 --error-rate 0.05
+#   LLM_BACKEND=stub python batch_summarizer.py
+class StubHandler(BaseHTTPRequestHandler):
+    latency = 0.2
+    token_delay = 0.01
+    error_rate = 0.0
+
+    def send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.latency)
+
+        if random.random() < self.error_rate:
+            status = random.choice([429, 503])
+            self.send_json(status, {"error": {"message": "stub overload"}}, {"Retry-After": "1"})
+            return
+
+        messages = request.get("messages", [])
+        question = messages[-1]["content"] if messages else ""
+        answer = f"[stub answer] {' '.join(question.split())[:200]}"
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = len(answer) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+        if request.get("stream"):
+            self.send_stream(request, answer, usage)
+            return
+
+        self.send_json(200, {
+            "id": f"stub-{time.time_ns()}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": answer},
+                "finish_reason": "stop",
+            }],
+            "usage": usage,
+        })
+
+    # Server-sent events, one word per chunk, token_delay apart
+    def send_stream(self, request, answer, usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        base = {
+            "id": f"stub-{time.time_ns()}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+        }
+        words = answer.split(" ")
+        for i, word in enumerate(words):
+            delta = {"content": word if i == 0 else " " + word}
+            if i == 0:
+                delta["role"] = "assistant"
+            self.send_event({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+            time.sleep(self.token_delay)
+        self.send_event({**base, "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]})
+        if request.get("stream_options", {}).get("include_usage"):
+            self.send_event({**base, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def send_event(self, payload):
+        self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host="127.0.0.1", port=8765, latency=0.2, error_rate=0.0, token_delay=0.01):
+    StubHandler.latency = latency
+    StubHandler.token_delay = token_delay
+    StubHandler.error_rate = error_rate
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    return server
+
+# --------------------------
+# 2. Run standalone
+# --------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between streamed words")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 429/503 responses")
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port, args.latency, args.error_rate, args.token_delay)
+    print(f"🧪 Stub LLM listening on http://{args.host}:{args.port} (latency {args.latency}s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
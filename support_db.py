@@ -0,0 +1,215 @@
+import sqlite3
+
+# -----------------------------
+# 1. Settings
+# -----------------------------
+DB_PATH = "ai_support_knowledge.db"
+
+# -----------------------------
+# 2. Schema
+# -----------------------------
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS tickets (
+        ticket_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        source_ticket_id TEXT,
+        customer_name TEXT,
+        issue_text TEXT,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS ai_summaries (
+        summary_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id INTEGER,
+        ai_summary TEXT,
+        root_cause TEXT,
+        recommendation TEXT,
+        model_used TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(ticket_id) REFERENCES tickets(ticket_id)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS resolutions (
+        resolution_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id INTEGER,
+        resolution_text TEXT,
+        resolved_by TEXT,
+        resolved_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(ticket_id) REFERENCES tickets(ticket_id)
+    );
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS feedback (
+        feedback_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ticket_id INTEGER,
+        rating INTEGER,
+        comment TEXT,
+        timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY(ticket_id) REFERENCES tickets(ticket_id)
+    );
+    """,
+]
+
+def create_tables(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+def column_names(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+# Databases made before ingestion was keyed by the source TicketID
+def add_source_ticket_id(conn):
+    if "source_ticket_id" not in column_names(conn, "tickets"):
+        conn.execute("ALTER TABLE tickets ADD COLUMN source_ticket_id TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_tickets_source_id ON tickets(source_ticket_id)")
+    # Also serves as the ai_summaries.ticket_id foreign-key index
+    conn.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_ai_summaries_ticket_model ON ai_summaries(ticket_id, model_used)"
+    )
+
+def add_lookup_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_resolutions_ticket ON resolutions(ticket_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_ticket ON feedback(ticket_id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tickets_created ON tickets(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_ai_summaries_timestamp ON ai_summaries(timestamp)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_resolutions_resolved ON resolutions(resolved_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_feedback_timestamp ON feedback(timestamp)")
+
+# Normalized issue-text embeddings for similar-ticket search (see
+# ticket_index.py), stored as float16 blobs: 2 bytes per dimension
+def add_ticket_embeddings(conn):
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS ticket_embeddings (
+        ticket_id INTEGER,
+        model_name TEXT,
+        dim INTEGER,
+        vector BLOB,
+        PRIMARY KEY (ticket_id, model_name),
+        FOREIGN KEY(ticket_id) REFERENCES tickets(ticket_id)
+    );
+    """)
+
+# -----------------------------
+# 3. Migrations
+# -----------------------------
+# MIGRATIONS[i] upgrades a database from user_version i to i + 1. Steps are
+# idempotent, so databases created before versioning upgrade cleanly.
+MIGRATIONS = [create_tables, add_source_ticket_id, add_lookup_indexes, add_ticket_embeddings]
+
+def migrate(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    for target, step in enumerate(MIGRATIONS[version:], start=version + 1):
+        with conn:
+            step(conn)
+            conn.execute(f"PRAGMA user_version = {target}")
+    return len(MIGRATIONS)
+
+# -----------------------------
+# 4. Connections
+# -----------------------------
+# WAL lets dashboards and the chat app read while ingestion writes;
+# synchronous=NORMAL is durable enough under WAL and avoids an fsync per commit.
+PRAGMAS = [
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA foreign_keys = ON",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+]
+
+# check_same_thread=False is for a connection handed from one thread to
+# another, never for one used by two threads at once
+def connect(path=DB_PATH, timeout=30, check_same_thread=True):
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=check_same_thread)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    migrate(conn)
+    return conn
+
+# -----------------------------
+# 5. Batched writes
+# -----------------------------
+# Buffers rows for one statement and writes them with executemany, committing
+# every batch_size rows so no single transaction grows without bound.
+class BatchWriter:
+    def __init__(self, conn, sql, batch_size=500):
+        self.conn = conn
+        self.sql = sql
+        self.batch_size = batch_size
+        self.rows = []
+        self.written = 0
+
+    def add(self, row):
+        self.rows.append(row)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        with self.conn:
+            self.conn.executemany(self.sql, self.rows)
+        self.written += len(self.rows)
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+# -----------------------------
+# 6. Ticket ingestion
+# -----------------------------
+INSERT_TICKET_SQL = "INSERT OR IGNORE INTO tickets (source_ticket_id, customer_name, issue_text) VALUES (?, ?, ?)"
+SAVE_SUMMARY_SQL = "INSERT OR REPLACE INTO ai_summaries (ticket_id, ai_summary, model_used) VALUES (?, ?, ?)"
+
+# Rows ingested before tickets were keyed by source id have it NULL. The
+# oldest one with the same customer and issue takes over the incoming id, so
+# re-running an old export adopts those rows (and their summaries) instead of
+# inserting the tickets again.
+ADOPT_LEGACY_TICKET_SQL = """
+    UPDATE tickets SET source_ticket_id = ?1
+    WHERE ticket_id = (
+        SELECT ticket_id FROM tickets
+        WHERE source_ticket_id IS NULL AND customer_name IS ?2 AND issue_text IS ?3
+        ORDER BY ticket_id LIMIT 1
+    )
+    AND NOT EXISTS (SELECT 1 FROM tickets WHERE source_ticket_id = ?1)
+"""
+
+def has_legacy_tickets(conn):
+    return conn.execute("SELECT 1 FROM tickets WHERE source_ticket_id IS NULL LIMIT 1").fetchone() is not None
+
+# rows are (source_ticket_id, customer_name, issue_text); tickets already
+# ingested under the same source id are left untouched. Returns how many
+# tickets were new (adopted legacy rows are not counted).
+def upsert_tickets(conn, rows, batch_size=1000):
+    rows = list(rows)
+    if has_legacy_tickets(conn):
+        with conn:
+            conn.executemany(ADOPT_LEGACY_TICKET_SQL, rows)
+    before = conn.total_changes
+    with BatchWriter(conn, INSERT_TICKET_SQL, batch_size) as writer:
+        for row in rows:
+            writer.add(row)
+    return conn.total_changes - before
+
+# Tickets with no ai_summaries row for this model yet, optionally limited to
+# a batch of source TicketIDs that was just ingested
+def pending_tickets(conn, model, source_ids=None):
+    sql = """
+        SELECT t.ticket_id, t.source_ticket_id, t.customer_name, t.issue_text
+        FROM tickets t
+        WHERE NOT EXISTS (
+            SELECT 1 FROM ai_summaries s WHERE s.ticket_id = t.ticket_id AND s.model_used = ?
+        )
+    """
+    params = [model]
+    if source_ids is not None:
+        sql += f" AND t.source_ticket_id IN ({', '.join('?' * len(source_ids))})"
+        params += list(source_ids)
+    return conn.execute(sql + " ORDER BY t.ticket_id", params).fetchall()
@@ -0,0 +1,210 @@
+import os
+import argparse
+import threading
+import numpy as np
+from metrics import timed
+from ann_index import build_ann_index
+from retrieval import ANN_INDEX, MODEL_NAME, DocIndex, normalize, search_vectors
+from support_db import DB_PATH, BatchWriter, connect
+
+# --------------------------
+# 1. Settings
+# --------------------------
+SIMILAR_TICKETS = int(os.getenv("SIMILAR_TICKETS", "3"))
+# Past tickets below this cosine are too far off to put into a prompt
+SIMILAR_MIN_SCORE = float(os.getenv("SIMILAR_TICKET_MIN_SCORE", "0.6"))
+# At or above this a new ticket is a repeat of a past one and reuses its summary
+DUPLICATE_THRESHOLD = float(os.getenv("TICKET_DUPLICATE_THRESHOLD", "0.95"))
+# Characters of each past summary/resolution put into a prompt
+TICKET_CONTEXT_CHARS = 600
+# Keeps "ticket_id IN (...)" under SQLite's bound-parameter limit
+LOOKUP_CHUNK = 500
+
+# --------------------------
+# 2. Ticket embeddings in the DB
+# --------------------------
+SAVE_TICKET_EMBEDDING_SQL = (
+    "INSERT OR REPLACE INTO ticket_embeddings (ticket_id, model_name, dim, vector) VALUES (?, ?, ?, ?)"
+)
+
+def decode_vectors(blobs):
+    return np.frombuffer(b"".join(blobs), dtype=np.float16).reshape(len(blobs), -1).astype(np.float32)
+
+def chunks(items, size=LOOKUP_CHUNK):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+# (ticket_id, issue_text) for tickets with no embedding for this model yet
+def unembedded_tickets(conn, model_name=MODEL_NAME):
+    return conn.execute("""
+        SELECT t.ticket_id, t.issue_text
+        FROM tickets t
+        WHERE NOT EXISTS (
+            SELECT 1 FROM ticket_embeddings e WHERE e.ticket_id = t.ticket_id AND e.model_name = ?
+        )
+        ORDER BY t.ticket_id
+    """, (model_name,)).fetchall()
+
+# rows are (ticket_id, issue_text). Tickets already embedded for this model
+# are read back instead of re-encoded. Returns {ticket_id: normalized vector}.
+def embed_tickets(conn, model, rows, model_name=MODEL_NAME, batch_size=64):
+    rows = list(rows)
+    vectors = {}
+    for part in chunks([ticket_id for ticket_id, _ in rows]):
+        stored = conn.execute(
+            f"SELECT ticket_id, vector FROM ticket_embeddings WHERE model_name = ? "
+            f"AND ticket_id IN ({', '.join('?' * len(part))})",
+            [model_name] + part,
+        ).fetchall()
+        if stored:
+            vectors.update(zip([r[0] for r in stored], decode_vectors([r[1] for r in stored])))
+
+    missing = [(ticket_id, issue or "") for ticket_id, issue in rows if ticket_id not in vectors]
+    if missing:
+        with timed("ticket_encode"):
+            encoded = normalize(model.encode([issue for _, issue in missing], batch_size=batch_size,
+                                             convert_to_numpy=True))
+        with BatchWriter(conn, SAVE_TICKET_EMBEDDING_SQL) as writer:
+            for (ticket_id, _), vector in zip(missing, encoded):
+                writer.add((ticket_id, model_name, len(vector), vector.astype(np.float16).tobytes()))
+                vectors[ticket_id] = vector
+    return vectors
+
+# Tickets ingested before embeddings existed, or embedded with another model
+def backfill(conn, model, model_name=MODEL_NAME):
+    rows = unembedded_tickets(conn, model_name)
+    embed_tickets(conn, model, rows, model_name)
+    return len(rows)
+
+# --------------------------
+# 3. In-memory similarity index
+# --------------------------
+# A DocIndex whose "passages" are ticket ids, loaded from ticket_embeddings
+# and topped up by refresh() as new tickets are embedded. Large histories get
+# the same IVF/HNSW index as the docs when ANN_INDEX is set.
+class TicketIndex:
+    def __init__(self, dim, model_name=MODEL_NAME, ann=ANN_INDEX):
+        self.model_name = model_name
+        self.ann = ann
+        self.index = DocIndex([], np.zeros((0, dim), dtype=np.float32))
+        self.last_id = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.index)
+
+    # Ticket ids only ever grow, so anything above last_id is new. The read is
+    # under the lock too, so concurrent callers never add the same rows twice.
+    def refresh(self, conn):
+        with self.lock:
+            rows = conn.execute(
+                "SELECT ticket_id, vector FROM ticket_embeddings WHERE model_name = ? AND ticket_id > ? "
+                "ORDER BY ticket_id",
+                (self.model_name, self.last_id),
+            ).fetchall()
+            if not rows:
+                return 0
+            ids = [r[0] for r in rows]
+            vectors = decode_vectors([r[1] for r in rows])
+            if type(self.index) is DocIndex:
+                # Exact search until the history is big enough for an ANN index
+                index = DocIndex(self.index.passages + ids, np.vstack([self.index.matrix, normalize(vectors)]))
+                self.index = build_ann_index(index, self.ann)
+            else:
+                self.index.add(ids, vectors)
+            self.last_id = ids[-1]
+        return len(rows)
+
+    # [(ticket_id, score), ...] best first, leaving out the exclude ids
+    def search(self, query_vector, top_k=SIMILAR_TICKETS, exclude=()):
+        with timed("ticket_search"), self.lock:
+            hits = search_vectors(self.index, query_vector, top_k + len(exclude))[0]
+            return [(self.index.passages[row], score) for row, score in hits
+                    if self.index.passages[row] not in exclude][:top_k]
+
+    # Search plus everything known about each hit: its issue, latest summary
+    # for summary_model (any model if None) and resolutions, newest first
+    def similar(self, conn, query_vector, top_k=SIMILAR_TICKETS, exclude=(), summary_model=None):
+        hits = self.search(query_vector, top_k, exclude)
+        return [describe_ticket(conn, ticket_id, score, summary_model) for ticket_id, score in hits]
+
+def describe_ticket(conn, ticket_id, score, summary_model=None):
+    source_id, customer, issue = conn.execute(
+        "SELECT source_ticket_id, customer_name, issue_text FROM tickets WHERE ticket_id = ?", (ticket_id,)
+    ).fetchone()
+    sql = "SELECT ai_summary FROM ai_summaries WHERE ticket_id = ?"
+    params = [ticket_id]
+    if summary_model:
+        sql += " AND model_used = ?"
+        params.append(summary_model)
+    summary = conn.execute(sql + " ORDER BY timestamp DESC LIMIT 1", params).fetchone()
+    resolutions = conn.execute(
+        "SELECT resolution_text FROM resolutions WHERE ticket_id = ? ORDER BY resolved_at DESC", (ticket_id,)
+    ).fetchall()
+    return {
+        "ticket_id": ticket_id,
+        "source_ticket_id": source_id,
+        "customer": customer,
+        "issue": issue,
+        "score": score,
+        "summary": summary[0] if summary else None,
+        "resolutions": [r[0] for r in resolutions],
+    }
+
+def load_ticket_index(conn, model, model_name=MODEL_NAME):
+    backfill(conn, model, model_name)
+    tickets = TicketIndex(model.get_sentence_embedding_dimension(), model_name)
+    tickets.refresh(conn)
+    return tickets
+
+# --------------------------
+# 4. Reuse and grounding
+# --------------------------
+# The closest past ticket at or above the threshold that already has a summary
+def find_duplicate(similar, threshold=DUPLICATE_THRESHOLD):
+    for ticket in similar:
+        if ticket["score"] >= threshold and ticket["summary"]:
+            return ticket
+    return None
+
+# (label, text) pairs in the same shape as doc matches, for build_context and
+# the summary prompt. Human resolutions are preferred over AI summaries.
+def ticket_matches(similar, min_score=SIMILAR_MIN_SCORE):
+    matches = []
+    for ticket in similar:
+        if ticket["score"] < min_score:
+            continue
+        if ticket["resolutions"]:
+            outcome = "Resolution: " + "\n".join(ticket["resolutions"])[:TICKET_CONTEXT_CHARS]
+        elif ticket["summary"]:
+            outcome = "Earlier summary: " + ticket["summary"][:TICKET_CONTEXT_CHARS]
+        else:
+            continue
+        matches.append((f"Past ticket {ticket['source_ticket_id'] or ticket['ticket_id']}",
+                        f"Issue: {ticket['issue']}\n{outcome}"))
+    return matches
+
+# --------------------------
+# 5. Command line lookup
+# --------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find the past tickets most similar to a description")
+    parser.add_argument("query")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--top-k", type=int, default=SIMILAR_TICKETS)
+    args = parser.parse_args()
+
+    from startup import load_embedding_model
+    model = load_embedding_model()
+    conn = connect(args.db)
+    tickets = load_ticket_index(conn, model)
+    print(f"🗂️ {len(tickets)} ticket(s) indexed.")
+    query_vector = normalize(model.encode(args.query, convert_to_numpy=True))
+    for ticket in tickets.similar(conn, query_vector, args.top_k):
+        print(f"\n🎫 {ticket['source_ticket_id'] or ticket['ticket_id']} ({ticket['customer']}) "
+              f"score {ticket['score']:.3f}\n  {ticket['issue']}")
+        for resolution in ticket["resolutions"]:
+            print(f"  ✅ {resolution}")
+        if ticket["summary"] and not ticket["resolutions"]:
+            print(f"  📝 {ticket['summary'][:200]}")
+    conn.close()
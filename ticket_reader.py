@@ -0,0 +1,71 @@
+import os
+import csv
+
+# -----------------------------
+# 1. Settings
+# -----------------------------
+TICKET_COLUMNS = ("TicketID", "Customer", "Issue")
+BATCH_SIZE = 500
+
+# -----------------------------
+# 2. Format-specific streaming readers
+# -----------------------------
+# Each reader yields lists of at most batch_size dicts keyed by TICKET_COLUMNS,
+# so memory stays flat no matter how large the export is.
+def batched_records(header, rows, batch_size):
+    positions = [header.index(column) for column in TICKET_COLUMNS]
+    batch = []
+    for row in rows:
+        if not any(row):
+            continue
+        batch.append({column: row[i] for column, i in zip(TICKET_COLUMNS, positions)})
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def read_xlsx(path, batch_size):
+    from openpyxl import load_workbook
+
+    # read_only streams rows from the sheet XML instead of building the workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(rows)]
+        yield from batched_records(header, rows, batch_size)
+    finally:
+        workbook.close()
+
+def read_csv(path, batch_size):
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        rows = csv.reader(f)
+        header = [cell.strip() for cell in next(rows)]
+        yield from batched_records(header, rows, batch_size)
+
+def read_parquet(path, batch_size):
+    import pyarrow.parquet as pq
+
+    parquet = pq.ParquetFile(path)
+    for record_batch in parquet.iter_batches(batch_size=batch_size, columns=list(TICKET_COLUMNS)):
+        yield record_batch.to_pylist()
+
+READERS = {
+    ".xlsx": read_xlsx,
+    ".xlsm": read_xlsx,
+    ".csv": read_csv,
+    ".parquet": read_parquet,
+}
+
+# -----------------------------
+# 3. Public API
+# -----------------------------
+def iter_ticket_batches(path, batch_size=BATCH_SIZE):
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in READERS:
+        raise ValueError(f"Unsupported ticket export format: {ext} (expected {', '.join(READERS)})")
+    return READERS[ext](path, batch_size)
+
+def iter_tickets(path, batch_size=BATCH_SIZE):
+    for batch in iter_ticket_batches(path, batch_size):
+        yield from batch
@@ -1,8 +1,4 @@
-import os
-from groq import Groq
-
-# Initialize client
-client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+from llm_gateway import chat
 
 # Example support ticket
 ticket = """
@@ -23,12 +19,8 @@ Ticket:
 {ticket}
 """
 
-# Use an open model (like LLaMA 3)
-response = client.chat.completions.create(
-model="llama-3.1-8b-instant",
-
-    messages=[{"role": "user", "content": prompt}]
-)
+# Uses the configured backend's default model (LLaMA 3 on Groq)
+summary = chat([{"role": "user", "content": prompt}])
 
 print("📝 AI Summary:\n")
-print(response.choices[0].message.content)
+print(summary)
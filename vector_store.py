@@ -0,0 +1,285 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import argparse
+import tempfile
+import numpy as np
+from embedding_cache import content_hash
+from retrieval import (
+    DOCS_FOLDER, MODEL_NAME, DocIndex, build_passage_index, encode_passages, normalize, passage_key, search_vectors,
+    split_passages, top_k_indices,
+)
+
+# --------------------------
+# 1. Settings
+# --------------------------
+# One directory per docs version: <dir>/<dtype>/<fingerprint>/. Every process
+# np.load()s the same files with mmap_mode="r", so Streamlit workers and CLIs
+# share a single copy through the OS page cache instead of each holding its
+# own float32 matrix. A published version is never written to again.
+EMBED_STORE_DIR = os.getenv("EMBED_STORE_DIR", "embedding_store")
+STORE_DTYPES = ("float16", "int8")
+# Characters of the fingerprint used as the version directory name
+VERSION_CHARS = 16
+# Unfinished builds older than this are left over from a crashed process
+STALE_BUILD_SECONDS = 3600
+# Candidates per requested hit that are re-scored against the float32 vectors
+RESCORE_FACTOR = int(os.getenv("EMBED_RESCORE_FACTOR", "4"))
+# Rows dequantized per matrix product, bounding the float32 scratch memory
+SCAN_CHUNK = 65536
+
+# --------------------------
+# 2. Quantization
+# --------------------------
+# Symmetric per-vector int8: x ≈ codes * scale, scale = max|x| / 127
+def quantize_int8(matrix):
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.round(matrix / scales[:, None]).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+def store_fingerprint(model_name, keys_and_hashes):
+    digest = hashlib.sha256(model_name.encode("utf-8"))
+    for key, h in keys_and_hashes:
+        digest.update(f"{key}\0{h}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def save_store(path, matrix, dtype, fingerprint):
+    if dtype == "int8":
+        codes, scales = quantize_int8(matrix)
+        np.save(os.path.join(path, "scales.npy"), scales)
+    else:
+        codes = matrix.astype(np.float16)
+    np.save(os.path.join(path, "codes.npy"), codes)
+    np.save(os.path.join(path, "full.npy"), matrix.astype(np.float32))
+    manifest = {"fingerprint": fingerprint, "dtype": dtype, "count": int(matrix.shape[0]), "dim": int(matrix.shape[1])}
+    with open(os.path.join(path, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+# Writes the store into a private temp directory and renames it into place, so
+# files another process may have mapped are never truncated. If a concurrent
+# builder published the same version first, its copy wins and ours is dropped.
+def publish_store(path, matrix, dtype, fingerprint):
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=".build-", dir=parent)
+    try:
+        save_store(tmp, matrix, dtype, fingerprint)
+        os.rename(tmp, path)
+    except OSError:
+        if load_manifest(path) is None:
+            raise
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def load_manifest(path):
+    try:
+        with open(os.path.join(path, "manifest.json"), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# --------------------------
+# 3. Quantized, memory-mapped index
+# --------------------------
+# Drop-in for DocIndex: search scans the float16/int8 codes, then re-scores the
+# best top_k * rescore_factor candidates against the float32 vectors. Only the
+# pages of those candidate rows are ever read from full.npy. A store version
+# never changes, so add() refuses: update_passage_index publishes a new
+# version instead.
+class QuantizedIndex(DocIndex):
+    def __init__(self, passages, path, rescore_factor=RESCORE_FACTOR):
+        manifest = load_manifest(path)
+        self.path = path
+        self.dtype = manifest["dtype"]
+        self.codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        self.scales = np.load(os.path.join(path, "scales.npy")) if self.dtype == "int8" else None
+        self.rescore_factor = rescore_factor
+        super().__init__(passages, np.load(os.path.join(path, "full.npy"), mmap_mode="r"))
+
+    def scores(self, queries):
+        out = np.empty((queries.shape[0], self.codes.shape[0]), dtype=np.float32)
+        for start in range(0, self.codes.shape[0], SCAN_CHUNK):
+            block = np.asarray(self.codes[start:start + SCAN_CHUNK], dtype=np.float32)
+            out[:, start:start + len(block)] = queries @ block.T
+        if self.scales is not None:
+            out *= self.scales
+        return out
+
+    def top_hits(self, query, scores, top_k):
+        if not self.rescore_factor:
+            return super().top_hits(query, scores, top_k)
+        rows = np.sort(top_k_indices(scores, top_k * self.rescore_factor))
+        exact = self.matrix[rows] @ query
+        return [(int(rows[i]), float(exact[i])) for i in top_k_indices(exact, top_k)]
+
+    # DocIndex.add would append to passages and matrix but not to the codes
+    # that search scans, leaving rows that can never be found
+    def add(self, passages, vectors):
+        raise TypeError(f"{type(self).__name__} is read-only (store version {self.path}); rebuild it with "
+                        f"retrieval.update_passage_index() or build_store_index(), which publish a new version")
+
+    def resident_bytes(self):
+        return self.codes.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+# (passages, version directory, fingerprint) for this docs version
+def store_version(docs, docs_folder=DOCS_FOLDER, dtype="int8", store_dir=EMBED_STORE_DIR):
+    if dtype not in STORE_DTYPES:
+        raise ValueError(f"Unknown store dtype: {dtype} (expected float32 or one of {', '.join(STORE_DTYPES)})")
+    passages = [p for name, text in docs.items() for p in split_passages(name, text)]
+    keys = [passage_key(docs_folder, p) for p in passages]
+    fingerprint = store_fingerprint(MODEL_NAME, ((k, content_hash(p.text)) for k, p in zip(keys, passages)))
+    return passages, os.path.join(store_dir, dtype, fingerprint[:VERSION_CHARS]), fingerprint
+
+# Reuses the version directory when the passages, their content and the model
+# are unchanged; otherwise encodes through the SQLite embedding cache and
+# publishes a new one next to it. Old versions stay until prune_stores().
+def build_store_index(model, docs, docs_folder=DOCS_FOLDER, dtype="int8", store_dir=EMBED_STORE_DIR):
+    passages, path, fingerprint = store_version(docs, docs_folder, dtype, store_dir)
+    if not passages:
+        return DocIndex([], np.zeros((0, model.get_sentence_embedding_dimension()), dtype=np.float32)), 0
+    manifest = load_manifest(path)
+    encoded = 0
+    if not manifest or manifest["fingerprint"] != fingerprint:
+        matrix, encoded = encode_passages(model, passages, docs_folder)
+        publish_store(path, matrix, dtype, fingerprint)
+        del matrix
+    return QuantizedIndex(passages, path), encoded
+
+# Deletes every stored version except the keep paths, plus builds abandoned
+# by crashed processes. Run it from a maintenance job rather than at startup:
+# on POSIX a process still mapping a deleted version keeps reading it, but
+# Windows refuses to delete mapped files.
+def prune_stores(keep, store_dir=EMBED_STORE_DIR, dtypes=STORE_DTYPES):
+    keep = {os.path.abspath(path) for path in keep}
+    removed = 0
+    for dtype in dtypes:
+        parent = os.path.join(store_dir, dtype)
+        if not os.path.isdir(parent):
+            continue
+        for entry in os.listdir(parent):
+            path = os.path.join(parent, entry)
+            if os.path.abspath(path) in keep:
+                continue
+            if entry.startswith(".build-") and time.time() - os.path.getmtime(path) < STALE_BUILD_SECONDS:
+                continue
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
+            removed += 1
+    return removed
+
+# Store root and dtype of a version directory (<store_dir>/<dtype>/<version>)
+def store_location(path):
+    parent = os.path.dirname(os.path.abspath(path))
+    return os.path.dirname(parent), os.path.basename(parent)
+
+# After a hot reload: drops every version of the live store's dtype except the
+# live one and the one it replaced, which questions already in flight may
+# still be reading. Versions of other dtypes are left to their own processes.
+def prune_superseded(live_path, previous_path=None):
+    store_dir, dtype = store_location(live_path)
+    keep = [live_path] + ([previous_path] if previous_path else [])
+    return prune_stores(keep, store_dir, (dtype,))
+
+# --------------------------
+# 4. Measure memory and recall on the doc set
+# --------------------------
+# Queries are the opening words of every passage plus any --query given, and
+# recall@k is the overlap with exact float32 search.
+def measure(model, docs, top_k=3, store_dir=EMBED_STORE_DIR, queries=()):
+    exact_index, _ = build_passage_index(model, docs, store_dtype="float32")
+    queries = list(queries) + [" ".join(p.text.split()[:12]) for p in exact_index.passages]
+    query_vectors = normalize(model.encode(queries, convert_to_numpy=True))
+    exact = [set(r for r, _ in hits) for hits in search_vectors(exact_index, query_vectors, top_k)]
+
+    report = {"passages": len(exact_index), "queries": len(queries), "float32_mb": exact_index.matrix.nbytes / 1e6}
+    for dtype in STORE_DTYPES:
+        index, _ = build_store_index(model, docs, dtype=dtype, store_dir=store_dir)
+        for factor in (0, RESCORE_FACTOR):
+            index.rescore_factor = factor
+            started = time.perf_counter()
+            found = search_vectors(index, query_vectors, top_k)
+            elapsed = time.perf_counter() - started
+            recall = np.mean([len(e & set(r for r, _ in hits)) / max(1, len(e)) for e, hits in zip(exact, found)])
+            report[f"{dtype}{'+rescore' if factor else ''}"] = {
+                "resident_mb": index.resident_bytes() / 1e6,
+                "reduction": exact_index.matrix.nbytes / index.resident_bytes(),
+                f"recall@{top_k}": float(recall),
+                "ms_per_query": elapsed / len(queries) * 1000,
+            }
+    return report
+
+# --------------------------
+# 5. Store check
+# --------------------------
+# In a scratch store directory: every row of a quantized index is searchable,
+# add() raises instead of leaving passages the codes do not cover, and an
+# edited doc comes back through a newly published version. Returns a list of
+# problems, empty when the check passes.
+def check_store(model, docs, docs_folder=DOCS_FOLDER, dtype="int8"):
+    errors = []
+    with tempfile.TemporaryDirectory(prefix="store-check-") as store_dir:
+        index, _ = build_store_index(model, docs, docs_folder, dtype, store_dir)
+        if len(index.passages) != len(index.codes):
+            errors.append(f"{len(index.passages)} passages but {len(index.codes)} code rows")
+        vectors = normalize(model.encode([p.text for p in index.passages], convert_to_numpy=True))
+        missed = [row for row, hits in enumerate(search_vectors(index, vectors, 1)) if hits[0][0] != row]
+        if missed:
+            errors.append(f"{len(missed)} passage(s) are not their own best hit")
+
+        try:
+            index.add(index.passages[:1], vectors[:1])
+            errors.append("add() on a quantized index did not raise")
+        except TypeError:
+            pass
+        if len(index.passages) != len(index.codes):
+            errors.append("add() changed the index before raising")
+
+        name = next(iter(docs))
+        edited = dict(docs)
+        edited[name] = docs[name] + "\n\nStore check: a paragraph that only the new version contains."
+        updated, _ = build_store_index(model, edited, docs_folder, dtype, store_dir)
+        if updated.path == index.path:
+            errors.append("an edited doc reused the old store version")
+        new_rows = [row for row, p in enumerate(updated.passages) if "Store check" in p.text]
+        query = normalize(model.encode(updated.passages[new_rows[-1]].text, convert_to_numpy=True))
+        if search_vectors(updated, query, 1)[0][0][0] != new_rows[-1]:
+            errors.append("the edited passage is not found in the new version")
+    return errors
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare float16/int8 stores with float32 search on the doc set")
+    parser.add_argument("--docs", default=DOCS_FOLDER)
+    parser.add_argument("--top-k", type=int, default=3)
+    parser.add_argument("--query", action="append", default=[])
+    parser.add_argument("--prune", action="store_true", help="delete store versions other than the current docs'")
+    parser.add_argument("--check", action="store_true", help="check store consistency in a scratch directory")
+    args = parser.parse_args()
+
+    from startup import load_embedding_model
+    from doc_ingest import load_docs
+    docs = load_docs(args.docs)
+
+    if args.check:
+        errors = [f"{dtype}: {e}" for dtype in STORE_DTYPES for e in check_store(load_embedding_model(), docs,
+                                                                                args.docs, dtype)]
+        for error in errors:
+            print(f"❌ {error}")
+        if errors:
+            raise SystemExit(1)
+        print(f"✅ {', '.join(STORE_DTYPES)} stores are consistent and read-only.")
+    elif args.prune:
+        keep = [store_version(docs, args.docs, dtype)[1] for dtype in STORE_DTYPES]
+        print(f"🧹 Removed {prune_stores(keep)} old store version(s).")
+    else:
+        report = measure(load_embedding_model(), docs, args.top_k, queries=args.query)
+        print(f"📦 {report['passages']} passages, {report['queries']} queries, "
+              f"float32 matrix {report['float32_mb']:.2f} MB")
+        for name, stats in report.items():
+            if isinstance(stats, dict):
+                print(f"  {name:<16} {stats['resident_mb']:8.2f} MB  {stats['reduction']:.1f}x smaller  "
+                      f"recall@{args.top_k} {stats[f'recall@{args.top_k}']:.3f}  {stats['ms_per_query']:.3f} ms/query")